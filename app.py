@@ -1,50 +1,77 @@
 # Import libraries
-import pandas as pd
-import plotly.express as px
+import glob
+import hashlib
+import os
+from typing import NamedTuple
+import numpy as np
 import dash_bootstrap_components as dbc
 from dash_bootstrap_templates import load_figure_template
-from dash import Dash, html, dcc, Input, Output, State
+from dash import Dash, html, dcc, Input, Output, State, ALL, MATCH, ClientsideFunction, ctx
+from dash.exceptions import PreventUpdate
+from client_payload import CLIENTSIDE, encode_payload
+from cooccurrence import CoOccurrence
+from data_cube import CubeEngine, load_cube
+from dataset_store import SURVEY_YEARS, DatasetStore, partition_dir
+from figure_cache import FigureCache
+from figures import FigureFactory, bar_figure, compare_figure, country_codes, map_figure, pie_figure
+from filter_engine import FilterEngine
+from metrics import METRICS, STARTUP, Collected, init_app, timed
+from survey_data import (RETAINED_COLUMNS, SHARED_DATA, SNAPSHOT_FORMAT, TECH_COLUMNS, SurveyData, load_survey,
+                         ranked_counts, selected_codes)
+from warmup import Warmup
 
 # Loading the figure themes
 load_figure_template("minty_dark")
 
-# Read the data
-data = pd.read_csv('clean_survey_data.csv')
+def cache_version():
+    """Return the tag of the figure cache entries, from the code that builds them and the survey CSVs.
+
+    Hashing the modules keeps a redeploy from serving figures built by the old code.
+    A missing CSV is left out, so its year only fails once it is selected.
+    """
+    version = hashlib.sha1(str(SNAPSHOT_FORMAT).encode())
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+        with open(path, 'rb') as file:
+            version.update(file.read())
+    for year, path in SURVEY_YEARS.items():
+        if os.path.exists(path):
+            version.update(f'{year}={os.stat(path).st_mtime_ns}'.encode())
+    return version.hexdigest()[:16]
+
+
+# Share rendered figures between workers, tagged with the code and datasets they came from
+figure_cache = FigureCache(version=cache_version())
 
 # Create the app 
 dbc_css = "https://cdn.jsdelivr.net/gh/AnnMarieW/dash-bootstrap-templates/dbc.min.css"
-app = Dash(__name__, external_stylesheets=[dbc.themes.MINTY, dbc_css, dbc.icons.BOOTSTRAP])
+# The chart graphs only exist once their tab is rendered
+app = Dash(__name__, external_stylesheets=[dbc.themes.MINTY, dbc_css, dbc.icons.BOOTSTRAP],
+           suppress_callback_exceptions=True)
 server = app.server
 app.title = "Dev Survey Dashboard"
 
-# Create list of age ranges
-ages = list(data['Age'].sort_values().unique())
-under18 = ages[-1]
-ages.insert(0, under18)
-ages.pop()
+# Stage timings on /metrics and in the Server-Timing header of every response
+init_app(server)
 
-# Create a list of education level
-ed_levels = list(data['EdLevel'].sort_values().unique())
+# Figure cache counters on /metrics, read from the cache file shared by every worker
+METRICS.append(Collected('dashboard_figure_cache_events_total', 'Hits, misses and evictions of the figure cache.',
+                         'counter', 'event',
+                         lambda: {event: value for event, value in figure_cache.stats().items()
+                                  if event in ('hits', 'misses', 'evictions')}))
+METRICS.append(Collected('dashboard_figure_cache_size', 'Entries and bytes held by the figure cache.',
+                         'gauge', 'unit',
+                         lambda: {unit: value for unit, value in figure_cache.stats().items()
+                                  if unit in ('entries', 'bytes')}))
 
-# Create a list of employments
-employ = data['Employment'].dropna().str.split(";")
-employ = employ.explode('Employment')
-employments = list(employ.sort_values().unique())
+# Columns of the filter dropdowns and the years coding the slider opens with
+FILTER_COLUMNS = ['Age', 'EdLevel', 'Employment', 'MainBranch']
+YEARS_CODE = [0, 50]
 
-# Create a list of Developer Status
-dev_status = list(data['MainBranch'].unique())
+# Encoded survey for the clientside callbacks, only filled in clientside mode
+survey_store = dcc.Store(id='survey-data')
 
-# Make a copy of the original data and include only targeted columns
-df = data[['MainBranch', 'Age', 'Employment', 
-           'EdLevel', 'YearsCode', 'Country', 
-           'LanguageHaveWorkedWith', 'LanguageWantToWorkWith', 'DatabaseHaveWorkedWith',
-           'DatabaseWantToWorkWith', 'PlatformHaveWorkedWith', 'PlatformWantToWorkWith',
-           'WebframeHaveWorkedWith', 'WebframeWantToWorkWith', 'ToolsTechHaveWorkedWith',
-           'ToolsTechWantToWorkWith', 'NEWCollabToolsHaveWorkedWith', 'NEWCollabToolsWantToWorkWith']].copy()
-
-# Explode the employment column
-df['Employment'] = df['Employment'].str.split(";")
-df = df.explode('Employment')
+# Technology drilled into, as "column;label", kept while switching tabs
+drill_store = dcc.Store(id='drill')
 
 # Define the layout
 app.layout = dbc.Container(children=[
@@ -65,12 +92,19 @@ app.layout = dbc.Container(children=[
         # Filters
         html.Div([
 
+            # Survey Year Filter
+            html.Div([
+                html.Label('Survey Year', htmlFor='year', className = 'mb-2 fs-5'),
+                dcc.Dropdown(id='year',
+                            options=list(SURVEY_YEARS),
+                            value=next(iter(SURVEY_YEARS)),
+                            clearable=False)
+            ], className = 'mb-4'),
+
             # Age Group Filter (Age)
             html.Div([
                 html.Label('Age', htmlFor='age', className = 'mb-2 fs-5'),
                 dcc.Dropdown(id='age',
-                            options=[{'label': i, 'value': i} for i in ages],
-                            value= [i for i in ages],
                             placeholder='Select Age Groups',
                             multi=True)
             ], className = 'mb-4'),
@@ -79,8 +113,6 @@ app.layout = dbc.Container(children=[
             html.Div([
                 html.Label('Education Level', htmlFor='ed-level', className = 'mb-2 fs-5'),
                 dcc.Dropdown(id='ed-level',
-                            options=[{'label': i, 'value': i} for i in ed_levels],
-                            value = [i for i in ed_levels],
                             placeholder='Select Education Levels',
                             multi=True)
             ], className = 'mb-4'),
@@ -89,8 +121,6 @@ app.layout = dbc.Container(children=[
             html.Div([
                 html.Label("Employment Status", htmlFor='employment-status', className = 'mb-2 fs-5'),
                 dcc.Dropdown(id = 'employment-status',
-                            options = [{'label': i, 'value': i} for i in employments],
-                            value = [i for i in employments],
                             placeholder = 'Select Employment Status',
                             multi=True)
             ] , className = 'mb-4'  
@@ -100,8 +130,6 @@ app.layout = dbc.Container(children=[
             html.Div([
                 html.Label("Developer Status", htmlFor = 'dev-status', className = 'mb-2 fs-5'),
                 dcc.Dropdown(id = 'dev-status',
-                            options = [{'label': i, 'value': i} for i in dev_status],
-                            value = [i for i in dev_status],
                             placeholder = "Select Developer Status",
                             multi=True
                 )
@@ -114,7 +142,7 @@ app.layout = dbc.Container(children=[
                                 min=0,
                                 max=50,
                                 tooltip={'placement': 'bottom', 'always_visible': True},
-                                value=[0,50],
+                                value=YEARS_CODE,
                                 marks={0 : '0', 50: '50'}
                 )
             ])
@@ -130,6 +158,8 @@ app.layout = dbc.Container(children=[
         dcc.Tabs(children = [
             dcc.Tab(value = 'tech-used', label = 'Technologies Used', className='fs-4 fw-bold'),
             dcc.Tab(value = 'tech-want', label = 'Technologies Desired', className='fs-4 fw-bold'),
+            dcc.Tab(value = 'tech-compare', label = 'Used vs Desired', className='fs-4 fw-bold'),
+            dcc.Tab(value = 'drill-down', label = 'Drill Down', className='fs-4 fw-bold'),
             dcc.Tab(value = 'demographics', label = 'Survey Demographics', className='fs-4 fw-bold')],
             value = 'tech-used',
             id = 'tabs',
@@ -140,6 +170,10 @@ app.layout = dbc.Container(children=[
         html.Div(id='output-container') 
     ], id='main'),
 
+    # Encoded survey for the clientside callbacks
+    survey_store,
+    drill_store,
+
 ], fluid=True, className='dbc p-4')
 
 # Callback for toggling filter button
@@ -153,405 +187,474 @@ def toggle_filters(n, is_open):
     return is_open
 
 
-# Callback decorator for applying filters
+# Cards of every tab, one list per row of (chart, card header, plot title, xl width)
+TAB_CARDS = {
+    'tech-used': [
+        [('lang-worked', "Programming Languages", "Top 10 Languages Used", 6),
+         ('db-worked', "Databases", "Top 10 Databases Used", 6)],
+        [('web-worked', "Web Frameworks", "Top 10 Web Frameworks Used", 6),
+         ('collab-worked', "Collaboration Tools", "Top 10 Collaboration Tools Used", 6)]],
+    'tech-want': [
+        [('lang-want', "Programming Languages", "Top 10 Languages Desired", 6),
+         ('db-want', "Databases", "Top 10 Databases Desired", 6)],
+        [('web-want', "Web Frameworks", "Top 10 Web Frameworks Desired", 6),
+         ('collab-want', "Collaboration Tools", "Top 10 Collaboration Tools Desired", 6)]],
+    'tech-compare': [
+        [('lang-compare', "Programming Languages", "Top 10 Languages Used vs Desired", 6),
+         ('db-compare', "Databases", "Top 10 Databases Used vs Desired", 6)],
+        [('web-compare', "Web Frameworks", "Top 10 Web Frameworks Used vs Desired", 6),
+         ('collab-compare', "Collaboration Tools", "Top 10 Collaboration Tools Used vs Desired", 6)]],
+    'drill-down': [
+        [('drill-lang', "Programming Languages", "Top 10 Languages Also Used", 6),
+         ('drill-db', "Databases", "Top 10 Databases Also Used", 6)],
+        [('drill-web', "Web Frameworks", "Top 10 Web Frameworks Also Used", 6),
+         ('drill-collab', "Collaboration Tools", "Top 10 Collaboration Tools Also Used", 6)]],
+    'demographics': [
+        [('country-map', "World Map", "Country Distribution", 8),
+         ('top-countries', "Countries", "Top 10 Participating Countries", 4)],
+        [('ed-level', "Education Level", "Education Level Distribution", 4),
+         ('dev-status', "Developer Status", "Developer Status Distribution", 4),
+         ('employment', "Employment Type", "Employment Type Distribution", 4)]],
+}
+
+# Top 10 bar charts: (column, axis label, horizontal)
+TECH_CHARTS = {
+    'lang-worked': ('LanguageHaveWorkedWith', 'Languages', False),
+    'db-worked': ('DatabaseHaveWorkedWith', 'Databases', False),
+    'web-worked': ('WebframeHaveWorkedWith', 'Web Frameworks', True),
+    'collab-worked': ('NEWCollabToolsHaveWorkedWith', 'Collaboration Tools', True),
+    'lang-want': ('LanguageWantToWorkWith', 'Language', False),
+    'db-want': ('DatabaseWantToWorkWith', 'Database', False),
+    'web-want': ('WebframeWantToWorkWith', 'Web Frameworks', True),
+    'collab-want': ('NEWCollabToolsWantToWorkWith', 'Collaboration Tools', True),
+}
+
+# Used vs desired charts of the top 10 technologies used: (retained column, axis label)
+COMPARE_CHARTS = {
+    'lang-compare': ('LanguageRetained', 'Languages'),
+    'db-compare': ('DatabaseRetained', 'Databases'),
+    'web-compare': ('WebframeRetained', 'Web Frameworks'),
+    'collab-compare': ('NEWCollabToolsRetained', 'Collaboration Tools'),
+}
+
+# Top 10 bar charts of the technologies also used by the respondents using the one
+# drilled into: (column, axis label, horizontal)
+DRILL_CHARTS = {
+    'drill-lang': ('LanguageHaveWorkedWith', 'Languages', False),
+    'drill-db': ('DatabaseHaveWorkedWith', 'Databases', False),
+    'drill-web': ('WebframeHaveWorkedWith', 'Web Frameworks', True),
+    'drill-collab': ('NEWCollabToolsHaveWorkedWith', 'Collaboration Tools', True),
+}
+
+# Charts whose bars drill into their technology when clicked, and the column drilled into
+DRILL_SOURCES = {chart: column for chart, (column, _, _) in TECH_CHARTS.items()
+                 if column in TECH_COLUMNS['tech-used']}
+DRILL_SOURCES.update({chart: RETAINED_COLUMNS[retained][0] for chart, (retained, _) in COMPARE_CHARTS.items()})
+
+# Country names too long for the bar chart axis
+SHORT_COUNTRIES = {'United States of America': 'USA', 'United Kingdom of Great Britain and Northern Ireland': 'UK'}
+
+# Demographics charts filled in by assets/clientside.js: (column, kind, values shown)
+DEMOGRAPHIC_CHARTS = {
+    'country-map': ('Country', 'map', None),
+    'top-countries': ('Country', 'bar', 10),
+    'ed-level': ('EdLevel', 'pie', None),
+    'dev-status': ('MainBranch', 'pie', None),
+    'employment': ('Employment', 'pie', None),
+}
+
+
+def default_filters(vocabularies):
+    """Return the filters the page opens with: every dropdown value selected and the whole slider."""
+    return [list(range(len(vocabularies[column]))) for column in FILTER_COLUMNS] + [YEARS_CODE]
+
+
+def chart_card(figures, chart, header, title, width):
+    """Return the card of one chart with its empty figure, get_chart or get_drill patches in the data."""
+    kind = 'drill' if chart in DRILL_CHARTS else 'chart'
+    return dbc.Col(dbc.Card([
+                        dbc.CardHeader(header),
+                        dbc.CardBody([html.H2(title, className='plot-title'),
+                                      dcc.Graph(id={'type': kind, 'chart': chart}, figure=figures.empty(chart),
+                                                className='plot w-100')],
+                                     className='p-4')
+                        ]),
+                   lg=12, xl=width, className='mb-4')
+
+
+def drill_picker(options, value):
+    """Return the row with the dropdown picking the technology to drill into."""
+    return dbc.Row(dbc.Col([
+                        html.Label('Respondents Using', htmlFor='drill-tech', className = 'mb-2 fs-5'),
+                        dcc.Dropdown(id='drill-tech', options=options, value=value, clearable=False)
+                   ], lg=12, xl=6, className='mb-4'), justify='center')
+
+
+def clientside_charts(figures, mapped, vocabularies):
+    """Describe every chart for the browser, with its empty figure to fill in."""
+    charts = {}
+    for chart, (column, _, horizontal) in TECH_CHARTS.items():
+        charts[chart] = {'column': column, 'kind': 'barh' if horizontal else 'bar', 'n': 10}
+    for chart, (column, kind, n) in DEMOGRAPHIC_CHARTS.items():
+        charts[chart] = {'column': column, 'kind': kind, 'n': n}
+    for chart, (retained, _) in COMPARE_CHARTS.items():
+        have, want = RETAINED_COLUMNS[retained]
+        charts[chart] = {'column': have, 'kind': 'compare', 'n': 10, 'want': want, 'retained': retained}
+    for chart, (column, _, horizontal) in DRILL_CHARTS.items():
+        charts[chart] = {'column': column, 'kind': 'barh' if horizontal else 'bar', 'n': 10}
+    for chart, spec in charts.items():
+        spec['figure'] = figures.empty(chart)
+
+    # The map has a fixed list of countries, the counts of the other codes are dropped
+    charts['country-map']['codes'] = mapped
+
+    # The bar chart shortens the longest country names
+    charts['top-countries']['labels'] = [SHORT_COUNTRIES.get(name, name) for name in vocabularies['Country']]
+    return charts
+
+
+class Partition(NamedTuple):
+    """One survey year, with everything the callbacks read from it."""
+
+    survey: SurveyData
+
+    # FilterEngine, or CubeEngine when the year's snapshot has a cube
+    engine: object
+
+    # Country codes on the world map, in the order of its locations
+    mapped: list
+
+    # Position of every technology used among the desired ones, -1 when nobody wants it, per compare chart
+    desired: dict
+
+    # FilterEngine of the drill-downs, which need respondent bitmaps even when the engine is a cube
+    filters: FilterEngine
+    cooccurrence: CoOccurrence
+
+    # Technologies to drill into, as dropdown options, and the one shown first
+    drill_options: list
+    drill_default: str
+    figures: FigureFactory
+
+    # Cards of every tab, with the empty figures of this year
+    layouts: dict
+
+    # Encoded survey for the clientside callbacks, None unless in clientside mode
+    payload: dict
+
+
+def load_partition(year, path):
+    """Load the survey of `year` from the CSV at `path`, or its snapshot when it is up to date."""
+    directory = partition_dir(year)
+    with timed('load', STARTUP):
+        survey = load_survey(path, directory)
+    vocabularies = survey.vocabularies
+
+    # Countries on the world map, located by their ISO-3 code resolved once here
+    # instead of by name in the browser; countries without a code are left off
+    countries = vocabularies['Country']
+    with timed('countries', STARTUP):
+        isos = country_codes(countries)
+    mapped = [code for code, iso in enumerate(isos) if iso is not None]
+
+    # Line up the desired technologies with the used ones, the retained counts already are
+    desired = {}
+    for chart, (retained, _) in COMPARE_CHARTS.items():
+        have, want = (survey.tech_matrices[column].labels for column in RETAINED_COLUMNS[retained])
+        position = {label: i for i, label in enumerate(want)}
+        desired[chart] = np.array([position.get(label, -1) for label in have], dtype=np.int64)
+
+    # Evaluate the filters incrementally, reusing the masks and counts of earlier requests,
+    # and answer the narrow selections from the pre-aggregated cube when one was built
+    with timed('engine', STARTUP):
+        filters = FilterEngine(survey)
+        cube = load_cube(directory, path, SHARED_DATA)
+        engine = CubeEngine(survey, cube, filters) if cube is not None else filters
+
+    # Co-occurrence of the technologies used among the respondents the default filters match
+    with timed('cooccurrence', STARTUP):
+        everyone = filters.rows(*default_filters(vocabularies))
+        cooccurrence = CoOccurrence(survey, [column for column, _, _ in DRILL_CHARTS.values()], everyone)
+
+    # Drill into the most used language until another technology is picked
+    drill_options = [{'label': f'{label} ({category})', 'value': f'{column};{label}'}
+                     for column, category, _ in DRILL_CHARTS.values()
+                     for label in survey.tech_matrices[column].labels]
+    languages = survey.tech_matrices['LanguageHaveWorkedWith'].labels
+    top_language = languages[np.argmax(filters.counts('LanguageHaveWorkedWith', everyone))]
+    drill_default = f'LanguageHaveWorkedWith;{top_language}'
+
+    # Every chart's figure, built once on the minty_dark template and filled in per request
+    with timed('figures', STARTUP):
+        figures = FigureFactory({
+            **{chart: ('barh' if horizontal else 'bar', bar_figure(label, horizontal))
+               for chart, (_, label, horizontal) in TECH_CHARTS.items()},
+            **{chart: ('compare', compare_figure(label)) for chart, (_, label) in COMPARE_CHARTS.items()},
+            **{chart: ('barh' if horizontal else 'bar', bar_figure(label, horizontal))
+               for chart, (_, label, horizontal) in DRILL_CHARTS.items()},
+            'country-map': ('map', map_figure('Country', [countries[i] for i in mapped],
+                                              [isos[i] for i in mapped])),
+            'top-countries': ('bar', bar_figure('Country')),
+            'ed-level': ('pie', pie_figure('Education Level')),
+            'dev-status': ('pie', pie_figure('Dev Type')),
+            'employment': ('pie', pie_figure('Employment Type')),
+        })
+
+    # The cards of every tab never change, so they are built once
+    with timed('layouts', STARTUP):
+        layouts = {tab: [dbc.Row([chart_card(figures, *card) for card in row], align='center', justify='center')
+                         for row in rows]
+                   for tab, rows in TAB_CARDS.items()}
+
+    payload = None
+    if CLIENTSIDE:
+        with timed('payload', STARTUP):
+            payload = encode_payload(survey, clientside_charts(figures, mapped, vocabularies))
+
+    return Partition(survey, engine, mapped, desired, filters, cooccurrence, drill_options, drill_default,
+                     figures, layouts, payload)
+
+
+# Every survey year, each loaded the first time it is selected
+datasets = DatasetStore(load_partition)
+
+
+# Callback for filling in the filters of the selected year
+@app.callback([Output(component_id='age', component_property='options'),
+               Output(component_id='age', component_property='value'),
+               Output(component_id='ed-level', component_property='options'),
+               Output(component_id='ed-level', component_property='value'),
+               Output(component_id='employment-status', component_property='options'),
+               Output(component_id='employment-status', component_property='value'),
+               Output(component_id='dev-status', component_property='options'),
+               Output(component_id='dev-status', component_property='value')],
+              Input(component_id='year', component_property='value'))
+
+# The dropdowns select values by their integer code in the year's vocabularies,
+# so a new year starts again from every value selected
+def get_filters(year):
+    vocabularies = datasets.get(year).survey.vocabularies
+    filters = []
+    for column, selected in zip(FILTER_COLUMNS, default_filters(vocabularies)):
+        filters.append([{'label': label, 'value': code} for code, label in enumerate(vocabularies[column])])
+        filters.append(selected)
+    return filters
+
+
+# Callback for rendering the cards of the selected tab
 @app.callback(Output(component_id='output-container', component_property='children'),
               Input(component_id='tabs', component_property='value'),
-              Input(component_id='age', component_property='value'),
-              Input(component_id='ed-level', component_property='value'),
-              Input(component_id='employment-status', component_property='value'),
-              Input(component_id='dev-status', component_property='value'),
-              Input(component_id='years-code', component_property='value'))
+              Input(component_id='year', component_property='value'),
+              State(component_id='drill', component_property='data'))
+
+# Only lays out the cards, so switching tabs never waits on an aggregate and
+# the charts of the tabs that are not shown are never computed
+def get_plots(tab, year, drill):
+    partition = datasets.get(year)
+    if tab == 'drill-down':
+        # Keep drilling into the same technology, if the year has it
+        values = {option['value'] for option in partition.drill_options}
+        value = drill if drill in values else partition.drill_default
+        return [drill_picker(partition.drill_options, value), *partition.layouts[tab]]
+    return partition.layouts[tab]
+
+
+# Callback for drilling into the technology of a clicked bar
+@app.callback(Output(component_id='tabs', component_property='value'),
+              Output(component_id='drill', component_property='data', allow_duplicate=True),
+              Input(component_id={'type': 'chart', 'chart': ALL}, component_property='clickData'),
+              prevent_initial_call=True)
+
+def drill_into(clicks):
+    column = DRILL_SOURCES.get(ctx.triggered_id['chart']) if ctx.triggered_id else None
+    points = (ctx.triggered[0]['value'] or {}).get('points')
+    if column is None or not points:
+        raise PreventUpdate
+
+    # Bars name their technology in label, the markers of the compare charts in x
+    return 'drill-down', f"{column};{points[0].get('label', points[0].get('x'))}"
+
+
+# Callback for remembering the technology picked in the drill-down
+@app.callback(Output(component_id='drill', component_property='data', allow_duplicate=True),
+              Input(component_id='drill-tech', component_property='value'),
+              prevent_initial_call=True)
+
+def pick_drill(tech):
+    return tech
+
+
+# Inputs of the chart callbacks, one request per chart so every
+# graph renders as soon as its own aggregate is ready
+chart_dependencies = [
+    Output(component_id={'type': 'chart', 'chart': MATCH}, component_property='figure'),
+    Input(component_id='year', component_property='value'),
+    Input(component_id='age', component_property='value'),
+    Input(component_id='ed-level', component_property='value'),
+    Input(component_id='employment-status', component_property='value'),
+    Input(component_id='dev-status', component_property='value'),
+    Input(component_id='years-code', component_property='value'),
+    State(component_id={'type': 'chart', 'chart': MATCH}, component_property='id')]
 
 # Callback function that gets executed 
-def get_plots(tab, age, ed_level, employ_status, dev_status, years_code):
-
-    df_filer = df.copy()
-
-    ## Technologies Used 
-    if tab == 'tech-used':
-        
-        # Filters the data
-        df_filer = df_filer[
-            (df_filer['Age'].isin(age)) &
-            (df_filer['EdLevel'].isin(ed_level)) &
-            (df_filer['Employment'].isin(employ_status)) &
-            (df_filer['MainBranch'].isin(dev_status)) &
-            (df_filer['YearsCode'] >= years_code[0]) &
-            (df_filer['YearsCode'] <= years_code[1])
-        ]
-        
-        ## Languages Used
-        ## LanguageHaveWorkedWith
-        lang_worked = df_filer[['Age', 'EdLevel', 'Employment', 'MainBranch', 'YearsCode', 'LanguageHaveWorkedWith']].copy()
-
-        # Since values are separated by a semicolon, it needs to be exploded
-        lang_worked['LanguageHaveWorkedWith'] = lang_worked['LanguageHaveWorkedWith'].str.split(";")
-        lang_worked = lang_worked.explode('LanguageHaveWorkedWith')
-
-        # Finding the top 10 languages
-        top10_lang_worked = lang_worked['LanguageHaveWorkedWith'].value_counts().sort_values(ascending=False).head(10).reset_index()
-
-        # Plot a bar chart
-        top10_lang_worked_plot = dcc.Graph(figure=px.bar(top10_lang_worked,
-                                                    x= 'LanguageHaveWorkedWith', 
-                                                    y='count',
-                                                    labels= {'LanguageHaveWorkedWith' : 'Languages',
-                                                            'count': 'Count'}
-                                                            ), className='plot w-100')
-        
-        ## Databases Used
-        ## DatabaseHaveWorkedWith
-        db_worked = df_filer[['Age', 'EdLevel', 'Employment', 'MainBranch', 'YearsCode', 'DatabaseHaveWorkedWith']].dropna().copy()
-
-        # Since values are separated by a semicolon, it needs to be exploded
-        db_worked['DatabaseHaveWorkedWith'] = db_worked['DatabaseHaveWorkedWith'].str.split(";")
-        db_worked = db_worked.explode('DatabaseHaveWorkedWith')
-
-        # Finding the top 10 databases
-        top10_db_worked = db_worked['DatabaseHaveWorkedWith'].value_counts().sort_values(ascending=False).head(10).reset_index()
-
-        # Plot a bar chart
-        top10_db_worked_plot = dcc.Graph(figure=px.bar(top10_db_worked,
-                                                    x= 'DatabaseHaveWorkedWith', 
-                                                    y='count',
-                                                    labels= {'DatabaseHaveWorkedWith' : 'Databases',
-                                                            'count': 'Count'}), className='plot w-100')
-        
-        ## Web Frameworks Used
-        ## WebframeHaveWorkedWith
-        web_worked = df_filer[['Age', 'EdLevel', 'Employment', 'MainBranch', 'YearsCode', 'WebframeHaveWorkedWith']].dropna().copy()
-
-        # Explode the column
-        web_worked['WebframeHaveWorkedWith'] = web_worked['WebframeHaveWorkedWith'].str.split(";")
-        web_worked = web_worked.explode('WebframeHaveWorkedWith')
-
-        # Finding the top 10 web frameworks
-        top10_web_worked = web_worked['WebframeHaveWorkedWith'].value_counts().sort_values(ascending=False).head(10).reset_index()
-
-        # Plot the horizontal bar chart
-        top10_web_worked_fig = px.bar(top10_web_worked,
-                                    x = 'count',
-                                    y = 'WebframeHaveWorkedWith',
-                                    labels={'WebframeHaveWorkedWith': 'Web Frameworks',
-                                            'count': 'Count'},
-                                    orientation='h')
-        
-        top10_web_worked_fig.update_layout(yaxis=dict(autorange="reversed"))
-        
-        top10_web_worked_plot = dcc.Graph(figure=top10_web_worked_fig, className='plot w-100')
-
-        ## Collaboration Tools Used
-        ## NEWCollabToolsHaveWorkedWith	
-        collab_worked = df_filer[['Age', 'EdLevel', 'Employment', 'MainBranch', 'YearsCode', 'NEWCollabToolsHaveWorkedWith']].dropna().copy()
-
-        # Explode the column
-        collab_worked['NEWCollabToolsHaveWorkedWith'] = collab_worked['NEWCollabToolsHaveWorkedWith'].str.split(";")
-        collab_worked = collab_worked.explode('NEWCollabToolsHaveWorkedWith')
-
-        # Finding the top 10 collaboration tools
-        top10_collab_worked = collab_worked['NEWCollabToolsHaveWorkedWith'].value_counts().sort_values(ascending=False).head(10).reset_index()
-
-        # Plot the horizontal bar chart
-        top10_collab_worked_fig = px.bar(top10_collab_worked,
-                                        x = 'count',
-                                        y = 'NEWCollabToolsHaveWorkedWith',
-                                        labels={'NEWCollabToolsHaveWorkedWith': 'Collaboration Tools',
-                                                'count': 'Count'},
-                                        orientation='h')
-        
-        top10_collab_worked_fig.update_layout(yaxis=dict(autorange="reversed"))
-        
-        top10_collab_worked_plot = dcc.Graph(figure=top10_collab_worked_fig, className='plot w-100')
-
-        # Return the plots
-        return [ 
-            dbc.Row([
-                dbc.Col(dbc.Card([
-                            dbc.CardHeader("Programming Languages"),
-                            dbc.CardBody([html.H2("Top 10 Languages Used", className='plot-title'), top10_lang_worked_plot], className='p-4')
-                            ]), 
-                        lg=12, xl=6, className='mb-4'),
-                dbc.Col(dbc.Card([
-                            dbc.CardHeader("Databases"),
-                            dbc.CardBody([html.H2("Top 10 Databases Used", className='plot-title'), top10_db_worked_plot], className='p-4')
-                            ]), 
-                        lg=12, xl=6, className='mb-4')
-                         ], align='center', justify='center'),
-            dbc.Row([
-                dbc.Col(dbc.Card([
-                            dbc.CardHeader("Web Frameworks"),
-                            dbc.CardBody([html.H2("Top 10 Web Frameworks Used", className='plot-title'), top10_web_worked_plot], className='p-4')
-                            ]), 
-                        lg=12, xl=6, className='mb-4'),
-                dbc.Col(dbc.Card([
-                            dbc.CardHeader("Collaboration Tools"),
-                            dbc.CardBody([html.H2("Top 10 Collaboration Tools Used", className='plot-title'), top10_collab_worked_plot], className='p-4')
-                            ]), 
-                        lg=12, xl=6, className='mb-4')
-                        ],align='center', justify='center')
-                ]
-    
-    ##################################
-    
-    ## Technologies Desired
-    elif tab == 'tech-want':
-
-        # Filters the data
-        df_filer = df_filer[
-            (df_filer['Age'].isin(age)) &
-            (df_filer['EdLevel'].isin(ed_level)) &
-            (df_filer['Employment'].isin(employ_status)) &
-            (df_filer['MainBranch'].isin(dev_status)) &
-            (df_filer['YearsCode'] >= years_code[0]) &
-            (df_filer['YearsCode'] <= years_code[1])
-        ]
-
-        ## Languages Desired
-        ## LanguageWantToWorkWith
-        lang_want = df_filer[['Age', 'EdLevel', 'Employment', 'MainBranch', 'YearsCode', 'LanguageWantToWorkWith']].dropna().copy()
-
-        # Since values are separated by a semicolon, it needs to be exploded
-        lang_want['LanguageWantToWorkWith'] = lang_want['LanguageWantToWorkWith'].str.split(";")
-        lang_want = lang_want.explode('LanguageWantToWorkWith')
-
-        # Finding the top 10 languages
-        top10_lang_want = lang_want['LanguageWantToWorkWith'].value_counts().sort_values(ascending=False).head(10).reset_index()
-
-        # Plot the bar graph
-        top10_lang_want_plot = dcc.Graph(figure=px.bar(top10_lang_want,
-                                                    x= 'LanguageWantToWorkWith', 
-                                                    y='count',
-                                                    labels= {'LanguageWantToWorkWith' : 'Language',
-                                                                'count': 'Count'}), className='plot w-100')
-        
-        ## Databases Desired
-        ## DatabaseWantToWorkWith
-        db_want = df_filer[['Age', 'EdLevel', 'Employment', 'MainBranch', 'YearsCode', 'DatabaseWantToWorkWith']].dropna().copy()
-
-        # Since values are separated by a semicolon, it needs to be exploded
-        db_want['DatabaseWantToWorkWith'] = db_want['DatabaseWantToWorkWith'].str.split(";")
-        db_want = db_want.explode('DatabaseWantToWorkWith')
-
-        # Finding the top 10 languages
-        top10_db_want = db_want['DatabaseWantToWorkWith'].value_counts().sort_values(ascending=False).head(10).reset_index()
-
-        # Plot the bar graph
-        top10_db_want_plot = dcc.Graph(figure=px.bar(top10_db_want,
-                                                    x= 'DatabaseWantToWorkWith', 
-                                                    y='count',
-                                                    labels= {'DatabaseWantToWorkWith' : 'Database',
-                                                                'count': 'Count'}), className='plot w-100')
-        
-        ## Web Frameworks Desired
-        ## WebframeWantToWorkWith
-        web_want = df_filer[['Age', 'EdLevel', 'Employment', 'MainBranch', 'YearsCode', 'WebframeWantToWorkWith']].dropna().copy()
-
-        # Explode the column
-        web_want['WebframeWantToWorkWith'] = web_want['WebframeWantToWorkWith'].str.split(";")
-        web_want = web_want.explode('WebframeWantToWorkWith')
-
-        # Finding the top 10 web frameworks
-        top10_web_want = web_want['WebframeWantToWorkWith'].value_counts().sort_values(ascending=False).head(10).reset_index()
-
-        # Plot the horizontal bar chart
-        top10_web_want_fig =px.bar(top10_web_want,
-                                    x = 'count',
-                                    y = 'WebframeWantToWorkWith',
-                                    labels={'WebframeWantToWorkWith': 'Web Frameworks',
-                                            'count': 'Count'},
-                                    orientation='h')
-        
-        top10_web_want_fig.update_layout(yaxis=dict(autorange="reversed"))
-        
-        top10_web_want_plot = dcc.Graph(figure=top10_web_want_fig, className='plot w-100')
-
-        ## Collaboration Tools Desired
-        ## NEWCollabToolsWantToWorkWith	
-        collab_want = df_filer[['Age', 'EdLevel', 'Employment', 'MainBranch', 'YearsCode', 'NEWCollabToolsWantToWorkWith']].dropna().copy()
-
-        # Explode the column
-        collab_want['NEWCollabToolsWantToWorkWith'] = collab_want['NEWCollabToolsWantToWorkWith'].str.split(";")
-        collab_want = collab_want.explode('NEWCollabToolsWantToWorkWith')
-
-        # Finding the top 10 collaboration tools
-        top10_collab_want = collab_want['NEWCollabToolsWantToWorkWith'].value_counts().sort_values(ascending=False).head(10).reset_index()
-
-        # Plot the horizontal bar chart
-        top10_collab_want_fig = px.bar(top10_collab_want,
-                                        x = 'count',
-                                        y = 'NEWCollabToolsWantToWorkWith',
-                                        labels={'NEWCollabToolsWantToWorkWith': 'Collaboration Tools',
-                                                'count': 'Count'},
-                                        orientation='h')
-        
-        top10_collab_want_fig.update_layout(yaxis=dict(autorange="reversed"))
-        
-        top10_collab_want_plot = dcc.Graph(figure=top10_collab_want_fig, className='plot w-100')
-
-        # Return the plots
-        return [ 
-            dbc.Row([
-                dbc.Col(dbc.Card([
-                            dbc.CardHeader("Programming Languages"),
-                            dbc.CardBody([html.H2("Top 10 Languages Desired", className='plot-title'), top10_lang_want_plot], className='p-4')
-                            ]), 
-                        lg=12, xl=6, className='mb-4'),
-                dbc.Col(dbc.Card([
-                            dbc.CardHeader("Databases"),
-                            dbc.CardBody([html.H2("Top 10 Databases Desired", className='plot-title'),top10_db_want_plot], className='p-4')
-                            ]), 
-                        lg=12, xl=6, className='mb-4')
-                         ], align='center', justify='center'),
-            dbc.Row([
-                dbc.Col(dbc.Card([
-                            dbc.CardHeader("Web Frameworks"),
-                            dbc.CardBody([html.H2("Top 10 Web Frameworks Desired", className='plot-title'),top10_web_want_plot], className='p-4')
-                            ]), 
-                        lg=12, xl=6, className='mb-4'),
-                dbc.Col(dbc.Card([
-                            dbc.CardHeader("Collaboration Tools"),
-                            dbc.CardBody([html.H2("Top 10 Collaboration Tools Desired", className='plot-title'), top10_collab_want_plot], className='p-4')
-                            ]), 
-                        lg=12, xl=6, className='mb-4')
-                        ],align='center', justify='center')
-                ]
-    ###################################
-
-    # Demographics
-    elif tab == 'demographics':
-
-        # Filters the data
-        df_filer = df_filer[
-            (df_filer['Age'].isin(age)) &
-            (df_filer['EdLevel'].isin(ed_level)) &
-            (df_filer['Employment'].isin(employ_status)) &
-            (df_filer['MainBranch'].isin(dev_status)) &
-            (df_filer['YearsCode'] >= years_code[0]) &
-            (df_filer['YearsCode'] <= years_code[1])
-        ]
-
-        ## Country Distribution
-        country_counts = df_filer['Country'].dropna().value_counts().reset_index()
-        country_counts.rename(columns={'count': 'Count'}, inplace = True)
-
-        # Plot the map
-        country_plot = dcc.Graph(figure=px.choropleth(country_counts,
-                                                      locations='Country',
-                                                      locationmode='country names',
-                                                      color='Count'
-                                                      ), 
-                                                      className='plot w-100',
-                                                      )
-    
-        ## Top 10 Countries
-        top10_countries = country_counts.sort_values(by='Count', ascending = False).head(10)
-        top10_countries['Country'].replace({'United States of America': 'USA', 'United Kingdom of Great Britain and Northern Ireland': 'UK'}, inplace=True)
-
-        # Plot the bar chart
-        top10_countries_plot = dcc.Graph(figure=px.bar(top10_countries,
-                                                       x='Country',
-                                                       y='Count'), className='plot')
-        
-        ## Education level Distribution
-        ed_level_counts = df_filer['EdLevel'].value_counts().reset_index()
-
-        ed_level_fig = px.pie(ed_level_counts,
-                                names='EdLevel',
-                                values='count',
-                                labels={'EdLevel': 'Education Level', 'count': 'Count'}
-                                )
-        
-        ed_level_fig.update_layout(
-            showlegend=False
-        )
-
-        ed_level_plot = dcc.Graph(figure=ed_level_fig, className='plot w-100')
+@figure_cache.memoize
+def get_chart(year, age, ed_level, employ_status, dev_status, years_code, chart):
+    partition = datasets.get(year)
+
+    # Filters the respondents into a packed bitmap
+    with timed('filter'):
+        rows = partition.engine.rows(age, ed_level, employ_status, dev_status, years_code)
+    return build_chart(partition, chart['chart'], rows, employ_status)
+
+
+def build_chart(partition, chart, rows, employ_status):
+    """Return the Patch filling in the data of `chart` for the respondents `rows`."""
+    with timed('aggregate'):
+        names, values = chart_data(partition, chart, rows, employ_status)
+    with timed('figure'):
+        return partition.figures.patch(chart, names, values)
+
+
+def chart_data(partition, chart, rows, employ_status):
+    """Return the names and values `chart` shows for the respondents `rows`."""
+    engine = partition.engine
+
+    ## Technologies Used and Desired
+    if chart in TECH_CHARTS:
+        column = TECH_CHARTS[chart][0]
+
+        # Finding the top 10 technologies
+        top10 = engine.ranked(column, rows, 10)
+        return top10[column].to_numpy(), top10['count'].to_numpy()
+
+    ## Technologies Used vs Desired
+    # The three counts are taken on the same filtered respondents, and the retained
+    # ones were precomputed per technology, so no extra pass is needed for the share
+    elif chart in COMPARE_CHARTS:
+        retained = COMPARE_CHARTS[chart][0]
+        have, want = RETAINED_COLUMNS[retained]
+        used = engine.counts(have, rows)
+
+        # Top 10 technologies used, ties in alphabetical order
+        top = np.argsort(-used, kind='stable')[:10]
+        top = top[used[top] > 0]
+        desired = np.append(engine.counts(want, rows), 0)[partition.desired[chart][top]]
+        # Rounded half up to one decimal like Math.round in assets/clientside.js, np.round rounds half to even
+        kept = np.floor(engine.counts(retained, rows)[top] * 1000 / used[top] + 0.5) / 10
+        return partition.survey.tech_matrices[have].labels[top], [used[top], desired, kept]
+
+    ## Country Distribution
+    # Only the counts are sent, the countries are already on the map
+    elif chart == 'country-map':
+        country_counts = engine.counts('Country', rows)[partition.mapped]
+        return None, [int(count) if count else None for count in country_counts]
+
+    ## Top 10 Countries
+    elif chart == 'top-countries':
+        top10_countries = engine.ranked('Country', rows, 10)
+        names = [SHORT_COUNTRIES.get(name, name) for name in top10_countries['Country']]
+        return names, top10_countries['count'].to_numpy()
+
+    ## Education level Distribution
+    elif chart == 'ed-level':
+        ed_level_counts = engine.ranked('EdLevel', rows)
+        return ed_level_counts['EdLevel'].to_numpy(), ed_level_counts['count'].to_numpy()
+
+    ## Developer Status Distribution
+    elif chart == 'dev-status':
+        dev_status_counts = engine.ranked('MainBranch', rows)
+        return dev_status_counts['MainBranch'].to_numpy(), dev_status_counts['count'].to_numpy()
+
+    ## Employment Distribution
+    elif chart == 'employment':
+        # Respondents can hold several employments, count the selected ones
+        employments = partition.survey.vocabularies['Employment']
+        selected = selected_codes(employ_status, len(employments))
+        employ_counts = ranked_counts([employments[i] for i in selected],
+                                      engine.counts('Employment', rows)[selected],
+                                      'Employment')
+        return employ_counts['Employment'].to_numpy(), employ_counts['count'].to_numpy()
+
+
+# Inputs of the drill-down callbacks, one request per chart like the other charts
+drill_dependencies = [
+    Output(component_id={'type': 'drill', 'chart': MATCH}, component_property='figure'),
+    *chart_dependencies[1:-1],
+    Input(component_id='drill-tech', component_property='value'),
+    State(component_id={'type': 'drill', 'chart': MATCH}, component_property='id')]
+
+# Callback function that gets executed
+@figure_cache.memoize
+def get_drill(year, age, ed_level, employ_status, dev_status, years_code, tech, chart):
+    partition = datasets.get(year)
+    column, _, label = (tech or '').partition(';')
+    code = partition.cooccurrence.code(column, label)
+    other = DRILL_CHARTS[chart['chart']][0]
+    if code is None:
+        return partition.figures.patch(chart['chart'], [], [])
+
+    with timed('filter'):
+        rows = partition.filters.rows(age, ed_level, employ_status, dev_status, years_code)
+    with timed('aggregate'):
+        counts = partition.cooccurrence.among(column, code, other, rows)
+
+        # Everyone drilled into uses the technology itself, leave it out
+        if other == column:
+            counts = counts.copy()
+            counts[code] = 0
+        top10 = ranked_counts(partition.survey.tech_matrices[other].labels, counts, other, 10)
+    with timed('figure'):
+        return partition.figures.patch(chart['chart'], top10[other].to_numpy(), top10['count'].to_numpy())
+
+
+# Filter in the browser in clientside mode, so an interaction costs the server nothing,
+# otherwise every chart is one server request
+if CLIENTSIDE:
+    # Callback for sending the encoded survey of the selected year
+    @app.callback(Output(component_id='survey-data', component_property='data'),
+                  Input(component_id='year', component_property='value'))
+    def get_survey(year):
+        return datasets.get(year).payload
+
+    # The survey is an Input, so switching years redraws the charts, and Dash wants every Input before the States
+    app.clientside_callback(ClientsideFunction(namespace='survey', function_name='chart'),
+                            *chart_dependencies[:-1],
+                            Input(component_id='survey-data', component_property='data'),
+                            chart_dependencies[-1])
+    app.clientside_callback(ClientsideFunction(namespace='survey', function_name='drill'),
+                            *drill_dependencies[:-1],
+                            Input(component_id='survey-data', component_property='data'),
+                            drill_dependencies[-1])
+else:
+    app.callback(*chart_dependencies)(get_chart)
+    app.callback(*drill_dependencies)(get_drill)
+
+def warm_up():
+    """Load the newest year and compute the charts every tab opens with, filling the figure cache."""
+    year = next(iter(SURVEY_YEARS))
+    partition = datasets.get(year)
+
+    # The browser draws the charts itself in clientside mode
+    if CLIENTSIDE:
+        return
+
+    filters = default_filters(partition.survey.vocabularies)
+    for tab, rows in TAB_CARDS.items():
+        get_plots(tab, year, None)
+        for chart, *_ in [card for row in rows for card in row]:
+            if chart in DRILL_CHARTS:
+                get_drill(year, *filters, partition.drill_default, {'type': 'drill', 'chart': chart})
+            else:
+                get_chart(year, *filters, {'type': 'chart', 'chart': chart})
+
+
+# Warm the worker up in the background, so the first visitor does not wait for the
+# newest year to load, and report on /ready once it is done
+warmup = Warmup(warm_up)
+warmup.init_app(server)
+warmup.start()
 
-        ## Developer Status Distribution
-        dev_status_counts = df_filer['MainBranch'].value_counts().reset_index()
-
-        dev_status_fig = px.pie(dev_status_counts,
-                                names='MainBranch',
-                                values='count',
-                                labels={'MainBranch': 'Dev Type', 'count': 'Count'})
-        
-        dev_status_fig.update_layout(showlegend = False)
-
-        dev_status_plot = dcc.Graph(figure=dev_status_fig, className='plot w-100')
-
-        ## Employment Distribution
-        employ_counts = df_filer['Employment'].value_counts().reset_index()
-
-        employ_counts_fig = px.pie(employ_counts,
-                                    names='Employment',
-                                    values='count',
-                                    labels={'Employment': 'Employment Type', 'count': 'Count'})
-        
-        employ_counts_fig.update_layout(showlegend = False)            
-    
-        employ_counts_plot = dcc.Graph(figure=employ_counts_fig, className='plot w-100')
-        
-        # Return the plots
-        return [
-            dbc.Row([
-                dbc.Col(
-                    dbc.Card([
-                        dbc.CardHeader("World Map"),
-                        dbc.CardBody([
-                            html.H2("Country Distribution", className='plot-title'),
-                            country_plot
-                        ], className='p-4')
-                    ]), lg=12, xl=8, className='mb-4'
-                ),
-                dbc.Col(
-                    dbc.Card([
-                        dbc.CardHeader("Countries"),
-                        dbc.CardBody([
-                            html.H2("Top 10 Participating Countries"),
-                            top10_countries_plot
-                        ], className='p-4')
-                    ]), lg=12, xl=4, className='mb-4'
-                )
-            ], align='center', justify='center'),
-            dbc.Row([
-                dbc.Col(
-                    dbc.Card([
-                        dbc.CardHeader("Education Level"),
-                        dbc.CardBody([
-                            html.H2("Education Level Distribution"),
-                            ed_level_plot
-                        ], className='p-4')
-                    ]), lg=12, xl=4, className='mb-4'
-                ),
-                dbc.Col(
-                    dbc.Card([
-                        dbc.CardHeader("Developer Status"),
-                        dbc.CardBody([
-                            html.H2("Developer Status Distribution"),
-                            dev_status_plot
-                        ], className='p-4')
-                    ]), lg=12, xl=4, className='mb-4'
-                ),
-                dbc.Col(
-                    dbc.Card([
-                        dbc.CardHeader("Employment Type"),
-                        dbc.CardBody([
-                            html.H2("Employment Type Distribution"),
-                            employ_counts_plot
-                        ], className='p-4')
-                    ]), lg=12, xl=4, className='mb-4'
-                )
-            ], align='center', justify='center')
-        ]
-        
 
 # Run the app
 if __name__ == '__main__':
     app.run()
-
-
-
-
-
-
-
@@ -0,0 +1,246 @@
+// Clientside filtering, used when the app runs with SURVEY_CLIENTSIDE=1.
+// Mirrors filter_rows and ranked_counts in survey_data.py on the payload
+// built by client_payload.py, so interactions never reach the server.
+(function () {
+
+    // Number of set bits in every byte
+    const POPCOUNT = new Uint8Array(256);
+    for (let i = 1; i < 256; i++) {
+        POPCOUNT[i] = (i & 1) + POPCOUNT[i >> 1];
+    }
+
+    // The decoded payload and the last filtered rows, shared by every chart
+    let survey = null;
+    let lastKey = null;
+    let lastRows = null;
+
+    // Decode an array from client_payload.encode_array
+    function decode(encoded, Type) {
+        const text = atob(encoded.data);
+        const bytes = new Uint8Array(text.length);
+        for (let i = 0; i < text.length; i++) {
+            bytes[i] = text.charCodeAt(i);
+        }
+        const array = new Type(bytes.buffer);
+        const width = encoded.shape.length > 1 ? encoded.shape[1] : array.length;
+        return {array: array, count: encoded.shape[0], width: width,
+                row: i => array.subarray(i * width, (i + 1) * width)};
+    }
+
+    function load(payload) {
+        const decodeAll = (arrays, Type) => Object.fromEntries(
+            Object.entries(arrays).map(([name, encoded]) => [name, decode(encoded, Type)]));
+        return {
+            size: payload.size,
+            width: Math.ceil(payload.size / 8),
+            filters: decodeAll(payload.filters, Uint8Array),
+            bitmaps: decodeAll(payload.bitmaps, Uint8Array),
+            codes: decodeAll(payload.codes, Int16Array),
+        };
+    }
+
+    // Sorted valid codes among the selected dropdown values
+    function selectedCodes(values, count) {
+        const codes = (values || []).filter(v => Number.isInteger(v) && v >= 0 && v < count);
+        return Array.from(new Set(codes)).sort((a, b) => a - b);
+    }
+
+    // OR together the bitmaps of the selected codes
+    function anyOf(bitmaps, values) {
+        const rows = new Uint8Array(survey.width);
+        for (const code of selectedCodes(values, bitmaps.count)) {
+            const row = bitmaps.row(code);
+            for (let j = 0; j < rows.length; j++) {
+                rows[j] |= row[j];
+            }
+        }
+        return rows;
+    }
+
+    // Respondents with years_code[0] <= YearsCode <= years_code[1]
+    function yearsBetween(upto, yearsCode) {
+        const [low, high] = yearsCode;
+        const top = upto.count - 1;
+        if (high < 0 || top < 0) {
+            return new Uint8Array(survey.width);
+        }
+        const rows = upto.row(Math.min(Math.trunc(high), top)).slice();
+        if (low > 0) {
+            const below = upto.row(Math.min(Math.ceil(low) - 1, top));
+            for (let j = 0; j < rows.length; j++) {
+                rows[j] &= ~below[j];
+            }
+        }
+        return rows;
+    }
+
+    function filterRows(age, edLevel, employStatus, devStatus, yearsCode) {
+        const key = JSON.stringify([age, edLevel, employStatus, devStatus, yearsCode]);
+        if (key === lastKey) {
+            return lastRows;
+        }
+
+        // A respondent matches a dropdown when any of its values is selected
+        const filters = survey.filters;
+        const rows = anyOf(filters.age, age);
+        const others = [anyOf(filters.ed_level, edLevel), anyOf(filters.employment, employStatus),
+                        anyOf(filters.dev_status, devStatus), yearsBetween(filters.years_upto, yearsCode)];
+        for (const other of others) {
+            for (let j = 0; j < rows.length; j++) {
+                rows[j] &= other[j];
+            }
+        }
+
+        lastKey = key;
+        lastRows = rows;
+        return rows;
+    }
+
+    // Counts of every value of `column` among the packed `rows`
+    function countColumn(column, rows) {
+        const bitmaps = survey.bitmaps[column];
+        if (bitmaps) {
+            const counts = new Array(bitmaps.count);
+            for (let i = 0; i < bitmaps.count; i++) {
+                const row = bitmaps.row(i);
+                let count = 0;
+                for (let j = 0; j < rows.length; j++) {
+                    count += POPCOUNT[row[j] & rows[j]];
+                }
+                counts[i] = count;
+            }
+            return counts;
+        }
+
+        const codes = survey.codes[column].array;
+        const counts = [];
+        for (let i = 0; i < survey.size; i++) {
+            if ((rows[i >> 3] >> (7 - (i & 7))) & 1 && codes[i] >= 0) {
+                counts[codes[i]] = (counts[codes[i]] || 0) + 1;
+            }
+        }
+        return counts;
+    }
+
+    // The top `n` non-zero counts of the `candidates` codes, ties in code order
+    function ranked(labels, counts, candidates, n) {
+        const order = candidates
+            .map((code, position) => [code, position])
+            .sort((a, b) => ((counts[b[0]] || 0) - (counts[a[0]] || 0)) || (a[1] - b[1]))
+            .map(([code]) => code)
+            .slice(0, n === null ? undefined : n)
+            .filter(code => counts[code] > 0);
+        return [order.map(code => labels[code]), order.map(code => counts[code])];
+    }
+
+    // The top `n` technologies used with how many want them and the share of their users
+    // keeping them, like the compare charts of chart_data in app.py
+    function compare(spec, labels, rows) {
+        const used = countColumn(spec.column, rows);
+        const desired = countColumn(spec.want, rows);
+        const kept = countColumn(spec.retained, rows);
+        const codes = labels[spec.column].map((_, code) => code);
+        const [top] = ranked(codes, used, codes, spec.n);
+
+        // The desired technologies have their own codes, line them up by name
+        const position = new Map(labels[spec.want].map((label, code) => [label, code]));
+        const names = top.map(code => labels[spec.column][code]);
+        const values = [top.map(code => used[code]),
+                        names.map(name => position.has(name) ? desired[position.get(name)] : 0),
+                        top.map(code => Math.round(kept[code] * 1000 / used[code]) / 10)];
+        const data = spec.figure.data.map((trace, i) => Object.assign({}, trace, {x: names, y: values[i]}));
+        return Object.assign({}, spec.figure, {data: data});
+    }
+
+    // Decode the payload of a new year, keeping the decoded one otherwise
+    function use(payload) {
+        if (survey === null || survey.payload !== payload) {
+            survey = load(payload);
+            survey.payload = payload;
+            lastKey = null;
+        }
+    }
+
+    // Respondents using the technology `tech`, "column;label", among the packed `rows`
+    function usersOf(tech, labels, rows) {
+        const split = (tech || '').indexOf(';');
+        const column = tech ? tech.slice(0, split) : null;
+        const code = column && labels[column] ? labels[column].indexOf(tech.slice(split + 1)) : -1;
+        const users = new Uint8Array(rows.length);
+        if (code >= 0) {
+            const row = survey.bitmaps[column].row(code);
+            for (let j = 0; j < rows.length; j++) {
+                users[j] = rows[j] & row[j];
+            }
+        }
+        return [column, code, users];
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        survey: {
+            // The payload is the encoded survey of the selected year
+            chart: function (year, age, edLevel, employStatus, devStatus, yearsCode, payload, id) {
+                if (!payload) {
+                    return window.dash_clientside.no_update;
+                }
+                use(payload);
+
+                const spec = payload.charts[id.chart];
+                const rows = filterRows(age, edLevel, employStatus, devStatus, yearsCode);
+                if (spec.kind === 'compare') {
+                    return compare(spec, payload.labels, rows);
+                }
+                const counts = countColumn(spec.column, rows);
+                const labels = spec.labels || payload.labels[spec.column];
+
+                // Respondents can hold several employments, count the selected ones
+                const candidates = spec.column === 'Employment'
+                    ? selectedCodes(employStatus, labels.length)
+                    : labels.map((_, code) => code);
+                const [names, values] = ranked(labels, counts, candidates, spec.n);
+
+                const trace = Object.assign({}, spec.figure.data[0]);
+                if (spec.kind === 'bar') {
+                    trace.x = names;
+                    trace.y = values;
+                } else if (spec.kind === 'barh') {
+                    trace.x = values;
+                    trace.y = names;
+                } else if (spec.kind === 'pie') {
+                    trace.labels = names;
+                    trace.values = values;
+                } else if (spec.kind === 'map') {
+                    // The countries are fixed, countries nobody picked stay blank
+                    trace.z = spec.codes.map(code => counts[code] > 0 ? counts[code] : null);
+                }
+                return Object.assign({}, spec.figure, {data: [trace]});
+            },
+
+            // Top technologies of one column among the respondents using the technology drilled into,
+            // like get_drill in app.py
+            drill: function (year, age, edLevel, employStatus, devStatus, yearsCode, tech, payload, id) {
+                if (!payload) {
+                    return window.dash_clientside.no_update;
+                }
+                use(payload);
+
+                const spec = payload.charts[id.chart];
+                const rows = filterRows(age, edLevel, employStatus, devStatus, yearsCode);
+                const [column, code, users] = usersOf(tech, payload.labels, rows);
+                const counts = countColumn(spec.column, users);
+
+                // Everyone drilled into uses the technology itself, leave it out
+                if (column === spec.column && code >= 0) {
+                    counts[code] = 0;
+                }
+                const labels = payload.labels[spec.column];
+                const [names, values] = ranked(labels, counts, labels.map((_, i) => i), spec.n);
+
+                const trace = Object.assign({}, spec.figure.data[0]);
+                trace.x = spec.kind === 'barh' ? values : names;
+                trace.y = spec.kind === 'barh' ? names : values;
+                return Object.assign({}, spec.figure, {data: [trace]});
+            }
+        }
+    });
+})();
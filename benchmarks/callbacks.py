@@ -0,0 +1,273 @@
+# Measure how the dashboard callbacks scale with the number of respondents
+#
+#   python benchmarks/callbacks.py [--sizes 10000 100000 1000000] [--repeat 10]
+#                                  [--snapshot] [--cube] [--save FILE] [--baseline FILE]
+#
+# Writes synthetic surveys with the columns of clean_survey_data.csv (kept in
+# --data-dir, so they are only generated once), then imports app.py on each one
+# in a fresh process and calls toggle_filters, get_plots and get_chart directly,
+# for every tab over a matrix of filter selections. Reports the p50/p99 latency
+# including JSON serialization, the peak traced memory and the serialized
+# response bytes of every callback. The figure cache is disabled so every call
+# does the full work.
+#
+# --save writes the results as a baseline, --baseline compares against one and
+# exits with 1 when a metric grew by more than --tolerance.
+
+# Import libraries
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dataset_store import DEFAULT_YEAR, partition_dir
+from survey_data import COLUMNS
+
+# Answers of the single choice columns, roughly as worded in the survey
+MAIN_BRANCH = ['I am a developer by profession', 'I am not primarily a developer, but I write code sometimes '
+               'as part of my work/studies', 'I am learning to code', 'I code primarily as a hobby',
+               'I used to be a developer by profession, but no longer am']
+AGES = ['Under 18 years old', '18-24 years old', '25-34 years old', '35-44 years old',
+        '45-54 years old', '55-64 years old', '65 years or older', 'Prefer not to say']
+ED_LEVELS = ['Primary/elementary school', 'Secondary school (e.g. American high school, German Realschule '
+             'or Gymnasium, etc.)', 'Some college/university study without earning a degree',
+             'Associate degree (A.A., A.S., etc.)', 'Bachelor’s degree (B.A., B.S., B.Eng., etc.)',
+             'Master’s degree (M.A., M.S., M.Eng., MBA, etc.)', 'Professional degree (JD, MD, Ph.D, Ed.D, etc.)',
+             'Something else']
+EMPLOYMENTS = ['Employed, full-time', 'Employed, part-time', 'Independent contractor, freelancer, or self-employed',
+               'Student, full-time', 'Student, part-time', 'Not employed, but looking for work',
+               'Not employed, and not looking for work', 'Retired', 'I prefer not to say']
+COUNTRIES = ['United States of America', 'Germany', 'India', 'United Kingdom of Great Britain and Northern Ireland',
+             'Ukraine', 'France', 'Canada', 'Poland', 'Netherlands', 'Brazil', 'Italy', 'Australia', 'Spain',
+             'Sweden', 'Russian Federation', 'Switzerland', 'Austria', 'Czech Republic', 'Israel', 'Turkey',
+             'Belgium', 'Denmark', 'Portugal', 'Norway', 'Romania', 'Pakistan', 'Iran, Islamic Republic of...',
+             'China', 'Mexico', 'New Zealand', 'Greece', 'Finland', 'South Africa', 'Argentina', 'Japan',
+             'Bangladesh', 'Hungary', 'Viet Nam', 'Indonesia', 'Nigeria', 'Republic of Korea', 'Nomadic']
+
+# Number of distinct technologies per technology column prefix
+TECHNOLOGIES = {'Language': 50, 'Database': 35, 'Platform': 25, 'Webframe': 40, 'ToolsTech': 45,
+                'NEWCollabTools': 30}
+
+# Distinct multi-select answers drawn per column, rows pick one of them
+ANSWER_POOL = 4096
+
+# Changes of a metric smaller than this are noise, never a regression
+NOISE = {'startup_s': 0.5, 'p50_ms': 0.1, 'p99_ms': 0.5, 'peak_kib': 16, 'bytes': 0}
+
+# Callback arguments (Age, EdLevel, Employment, MainBranch codes and YearsCode range)
+# of every filter selection, built from the vocabulary sizes
+SELECTIONS = {
+    'all': lambda sizes: [list(range(size)) for size in sizes] + [[0, 50]],
+    'single': lambda sizes: [[2], [4], [0], [0], [0, 50]],
+    'narrow': lambda sizes: [[1, 2, 3], [3, 4, 5], [0, 1, 2], [0, 1], [5, 20]],
+    'none': lambda sizes: [list(range(sizes[0])), list(range(sizes[1])), [], list(range(sizes[3])), [0, 50]],
+}
+
+
+def weights(count, rng):
+    """Return Zipf-like selection weights, so a few answers dominate like in the survey."""
+    p = 1 / np.arange(1, count + 1) ** 0.8
+    return rng.permutation(p / p.sum())
+
+
+def answer_pool(labels, rng, low=1, high=6):
+    """Return ANSWER_POOL semicolon separated answers of `low` to `high` of the `labels`."""
+    p = weights(len(labels), rng)
+    return np.array([';'.join(rng.choice(labels, size=rng.integers(low, high + 1), replace=False, p=p))
+                     for _ in range(ANSWER_POOL)], dtype=object)
+
+
+def pick(values, size, rng, missing=0.0):
+    """Draw `size` of the `values`, a `missing` fraction of them left empty."""
+    values = np.asarray(values, dtype=object)
+    column = values[rng.choice(len(values), size=size, p=weights(len(values), rng))]
+    column[rng.random(size) < missing] = None
+    return column
+
+
+def synthetic_survey(size, seed=0):
+    """Return a DataFrame of `size` respondents with the columns of clean_survey_data.csv."""
+    rng = np.random.default_rng(seed)
+    years = rng.gamma(2.0, 6.0, size).round().clip(0, 50)
+    years[rng.random(size) < 0.02] = np.nan
+
+    data = {'MainBranch': pick(MAIN_BRANCH, size, rng),
+            'Age': pick(AGES, size, rng),
+            'Employment': pick(answer_pool(EMPLOYMENTS, rng, high=3), size, rng),
+            'EdLevel': pick(ED_LEVELS, size, rng, missing=0.05),
+            'YearsCode': years,
+            'Country': pick(COUNTRIES, size, rng)}
+    for prefix, count in TECHNOLOGIES.items():
+        labels = [f'{prefix} {i}' for i in range(count)]
+        for suffix, missing in [('HaveWorkedWith', 0.1), ('WantToWorkWith', 0.2)]:
+            data[prefix + suffix] = pick(answer_pool(labels, rng), size, rng, missing)
+    return pd.DataFrame(data)[COLUMNS]
+
+
+def survey_csv(size, directory):
+    """Return the path of the synthetic survey of `size` respondents, writing it if needed."""
+    path = os.path.join(directory, f'survey-{size}.csv')
+    if not os.path.exists(path):
+        print(f'Writing {path}', file=sys.stderr)
+        synthetic_survey(size).to_csv(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def calls(app):
+    """Return the (callback name, function) pairs to measure, for every tab and filter selection."""
+    from dash._utils import to_json
+
+    year = next(iter(app.SURVEY_YEARS))
+    vocabularies = app.datasets.get(year).survey.vocabularies
+    sizes = [len(vocabularies[column]) for column in ['Age', 'EdLevel', 'Employment', 'MainBranch']]
+    pairs = [('toggle_filters', lambda: to_json(app.toggle_filters(1, False)))]
+    drill = app.datasets.get(year).drill_default
+    for tab, rows in app.TAB_CARDS.items():
+        pairs.append((f'get_plots {tab}', lambda tab=tab: to_json(app.get_plots(tab, year, None))))
+        for selection in SELECTIONS.values():
+            filters = selection(sizes)
+            for chart, *_ in [card for row in rows for card in row]:
+                if chart in app.DRILL_CHARTS:
+                    pairs.append((f'get_drill {tab}',
+                                  lambda filters=filters, chart=chart: to_json(
+                                      app.get_drill(year, *filters, drill, {'type': 'drill', 'chart': chart}))))
+                else:
+                    pairs.append((f'get_chart {tab}',
+                                  lambda filters=filters, chart=chart: to_json(
+                                      app.get_chart(year, *filters, {'type': 'chart', 'chart': chart}))))
+    return pairs
+
+
+def run(repeat):
+    """Import app.py and measure its callbacks, see the module comment."""
+    start = time.perf_counter()
+    import app
+
+    # Startup includes loading the newest year, which the warm-up would do in the background
+    app.datasets.get(next(iter(app.SURVEY_YEARS)))
+    results = {'startup_s': time.perf_counter() - start}
+
+    pairs = calls(app)
+    samples, peaks, sizes = {}, {}, {}
+
+    # Latency first, with tracemalloc off so it does not slow the calls down
+    for _ in range(repeat):
+        for name, call in pairs:
+            start = time.perf_counter()
+            response = call()
+            samples.setdefault(name, []).append(time.perf_counter() - start)
+            sizes.setdefault(name, []).append(len(response.encode()))
+
+    tracemalloc.start()
+    for name, call in pairs:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        call()
+        peaks[name] = max(peaks.get(name, 0), tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    for name in samples:
+        results[name] = {'p50_ms': float(np.percentile(samples[name], 50)) * 1000,
+                         'p99_ms': float(np.percentile(samples[name], 99)) * 1000,
+                         'peak_kib': peaks[name] / 1024,
+                         'bytes': float(np.mean(sizes[name]))}
+    return results
+
+
+def measure(path, args, directory):
+    """Run the callbacks on the survey CSV at `path` in a fresh process and return the results."""
+    snapshot = os.path.join(directory, 'no-snapshot')
+    if args.snapshot or args.cube:
+        snapshot = os.path.join(directory, os.path.basename(path) + '.snapshot')
+        command = [sys.executable, os.path.join(ROOT, 'build_snapshot.py'),
+                   '--csv', path, '--out', partition_dir(DEFAULT_YEAR, snapshot)]
+        subprocess.run(command + (['--cube'] if args.cube else []), check=True, stdout=sys.stderr)
+
+    env = dict(os.environ, SURVEY_DATA_PATH=path, SURVEY_YEARS='', SURVEY_SNAPSHOT_DIR=snapshot,
+               SURVEY_CLIENTSIDE='0', SURVEY_WARMUP='0',
+               FIGURE_CACHE_MAX_BYTES='0', FIGURE_CACHE_PATH=os.path.join(directory, 'cache.sqlite3'))
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', '--repeat', str(args.repeat)],
+                            env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Print every metric next to its baseline and return whether any grew past `tolerance`."""
+    regressed = False
+    for size, callbacks in results.items():
+        for name, metrics in callbacks.items():
+            old = baseline.get(size, {}).get(name)
+            if old is None:
+                continue
+            if not isinstance(metrics, dict):
+                metrics, old = {name: metrics}, {name: old}
+            for metric, value in metrics.items():
+                before = old[metric]
+                ratio = value / before if before else 1.0
+                flag = ''
+                if ratio > tolerance and value - before > NOISE[metric]:
+                    flag, regressed = '  REGRESSED', True
+                print(f'{size:>8} {name:<24} {metric:<8} {before:12.2f} -> {value:12.2f} '
+                      f'({ratio - 1:+7.1%}){flag}')
+    return regressed
+
+
+def report(results):
+    """Print the results as one table per survey size."""
+    for size, callbacks in results.items():
+        print(f'\n{size} respondents, startup {callbacks["startup_s"]:.2f} s')
+        print(f'{"callback":<24} {"p50 ms":>9} {"p99 ms":>9} {"peak KiB":>10} {"bytes":>9}')
+        for name, metrics in callbacks.items():
+            if name != 'startup_s':
+                print(f'{name:<24} {metrics["p50_ms"]:9.2f} {metrics["p99_ms"]:9.2f} '
+                      f'{metrics["peak_kib"]:10.1f} {metrics["bytes"]:9.0f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure callback latency, memory and payload size.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='respondents of each synthetic survey')
+    parser.add_argument('--repeat', type=int, default=10, help='calls of every callback per measurement')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'dev-survey-benchmark'),
+                        help='where the synthetic surveys are kept')
+    parser.add_argument('--snapshot', action='store_true', help='load the surveys from a snapshot')
+    parser.add_argument('--cube', action='store_true', help='also build the data cube of the snapshot')
+    parser.add_argument('--save', help='write the results to this baseline file')
+    parser.add_argument('--baseline', help='compare the results with this baseline file')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='largest accepted growth of a metric')
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # The child process measuring one survey
+    if args.run:
+        print(json.dumps(run(args.repeat)))
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = {str(size): measure(survey_csv(size, args.data_dir), args, args.data_dir) for size in args.sizes}
+    report(results)
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        print()
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
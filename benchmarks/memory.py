@@ -0,0 +1,105 @@
+# Measure how much memory a dashboard request allocates
+#
+#   python benchmarks/memory.py [--csv clean_survey_data.csv --year 2024] [--requests 20]
+#   python benchmarks/memory.py --ingest [--chunk-rows 65536]
+#
+# "before" replays the original get_plots data path (copy the Employment-exploded
+# frame, filter it with isin, then split/explode/value_counts every technology
+# column); "after" is the current path through the filter engine. Both run the
+# same default-filter requests for the tech-used tab, figures excluded, and the
+# figure cache is bypassed so every request does the full work.
+#
+# With --ingest it measures loading the survey instead: "whole" parses the CSV
+# into a single frame like app.py used to, "chunked" is read_survey streaming it
+# `--chunk-rows` respondents at a time.
+
+# Import libraries
+import argparse
+import os
+import sys
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_store import DEFAULT_YEAR, partition_dir
+from filter_engine import FilterEngine
+from survey_data import CHUNK_ROWS, COLUMNS, DATA_PATH, TECH_COLUMNS, load_survey, read_survey
+
+
+def legacy_frame(path):
+    """Load the survey the way app.py used to: all 18 columns, exploded on Employment."""
+    df = pd.read_csv(path)[COLUMNS].copy()
+    df['Employment'] = df['Employment'].str.split(';')
+    return df.explode('Employment')
+
+
+def legacy_request(df, age, ed_level, employ_status, dev_status, years_code):
+    """The data path of the original get_plots for the tech-used tab."""
+    df_filer = df.copy()
+    df_filer = df_filer[
+        (df_filer['Age'].isin(age)) &
+        (df_filer['EdLevel'].isin(ed_level)) &
+        (df_filer['Employment'].isin(employ_status)) &
+        (df_filer['MainBranch'].isin(dev_status)) &
+        (df_filer['YearsCode'] >= years_code[0]) &
+        (df_filer['YearsCode'] <= years_code[1])
+    ]
+    for column in TECH_COLUMNS['tech-used']:
+        worked = df_filer[['Age', 'EdLevel', 'Employment', 'MainBranch', 'YearsCode', column]].dropna().copy()
+        worked[column] = worked[column].str.split(';')
+        worked = worked.explode(column)
+        worked[column].value_counts().sort_values(ascending=False).head(10).reset_index()
+
+
+def engine_request(engine, *filters):
+    """The data path of the current get_chart callbacks for the tech-used tab."""
+    rows = engine.rows(*filters)
+    for column in TECH_COLUMNS['tech-used']:
+        engine.ranked(column, rows, 10)
+
+
+def measure(name, request, requests):
+    """Print the mean and worst peak allocation of `requests` calls to `request`."""
+    peaks = []
+    tracemalloc.start()
+    for _ in range(requests):
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        request()
+        peaks.append(tracemalloc.get_traced_memory()[1] - start)
+    tracemalloc.stop()
+    print(f'{name:<8} mean peak {sum(peaks) / len(peaks) / 2**20:8.2f} MiB   '
+          f'max peak {max(peaks) / 2**20:8.2f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-request memory allocation.')
+    parser.add_argument('--csv', default=DATA_PATH, help='cleaned survey CSV')
+    parser.add_argument('--year', default=DEFAULT_YEAR, help='survey year of --csv, whose snapshot is loaded')
+    parser.add_argument('--requests', type=int, default=20, help='requests to measure')
+    parser.add_argument('--ingest', action='store_true', help='measure loading the CSV instead of requests')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='respondents parsed at a time')
+    args = parser.parse_args()
+
+    if args.ingest:
+        measure('whole', lambda: pd.read_csv(args.csv, usecols=COLUMNS), 1)
+        measure('chunked', lambda: read_survey(args.csv, args.chunk_rows), 1)
+        return
+
+    # Default filters: every dropdown value selected, full YearsCode range
+    survey = load_survey(args.csv, partition_dir(args.year))
+    vocabularies = survey.vocabularies
+    codes = [list(range(len(vocabularies[column]))) for column in ['Age', 'EdLevel', 'Employment', 'MainBranch']]
+    labels = [vocabularies[column] for column in ['Age', 'EdLevel', 'Employment', 'MainBranch']]
+
+    df = legacy_frame(args.csv)
+    measure('before', lambda: legacy_request(df, *labels, [0, 50]), args.requests)
+
+    # A fresh engine per request, so nothing is served from its memo
+    measure('after', lambda: engine_request(FilterEngine(survey), *codes, [0, 50]), args.requests)
+
+
+if __name__ == '__main__':
+    main()
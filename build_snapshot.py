@@ -0,0 +1,54 @@
+# Build the columnar snapshots of the survey years that app.py loads
+#
+#   python build_snapshot.py [--year 2024 ...] [--cube]
+#   python build_snapshot.py --csv clean_survey_data.csv --out survey_snapshot/2024 [--cube]
+#
+# Run it after updating a CSV (e.g. as part of the deploy build command),
+# otherwise every worker falls back to parsing the CSV the first time its year
+# is shown. Each year of SURVEY_YEARS gets its own directory in
+# SURVEY_SNAPSHOT_DIR. With --cube it also pre-aggregates the counts over the
+# filter dimensions into a data cube.
+
+# Import libraries
+import argparse
+
+from data_cube import build_cube, remove_cube, save_cube
+from dataset_store import SURVEY_YEARS, partition_dir
+from survey_data import read_survey, save_snapshot
+
+
+def build(path, directory, cube):
+    """Write the snapshot of the CSV at `path` to `directory`, with its data cube if `cube`."""
+    survey = read_survey(path)
+    save_snapshot(survey, directory, path)
+    print(f'Wrote snapshot of {path} to {directory}')
+
+    if cube:
+        cube = build_cube(survey)
+        save_cube(cube, directory, path)
+        print(f'Wrote data cube of {len(cube.cells)} cells x {cube.counts.shape[1]} values to {directory}')
+    else:
+        remove_cube(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the survey CSVs into columnar snapshots.')
+    parser.add_argument('--year', nargs='+', choices=list(SURVEY_YEARS),
+                        help='survey years to build (defaults to every year in SURVEY_YEARS)')
+    parser.add_argument('--csv', help='build a single cleaned survey CSV instead, needs --out')
+    parser.add_argument('--out', help='snapshot directory of --csv')
+    parser.add_argument('--cube', action='store_true', help='also build the pre-aggregated data cube')
+    args = parser.parse_args()
+
+    if args.csv:
+        if not args.out:
+            parser.error('--csv needs --out')
+        build(args.csv, args.out, args.cube)
+        return
+
+    for year in args.year or SURVEY_YEARS:
+        build(SURVEY_YEARS[year], partition_dir(year), args.cube)
+
+
+if __name__ == '__main__':
+    main()
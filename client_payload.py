@@ -0,0 +1,43 @@
+# Import libraries
+import base64
+import os
+
+import numpy as np
+
+from survey_data import FILTERS
+
+# Ship the encoded survey to the browser once and filter there instead of on the server
+CLIENTSIDE = os.environ.get('SURVEY_CLIENTSIDE', '0') == '1'
+
+# Columns counted in the browser from the packed bitmaps of the filter index
+INDEX_COLUMNS = {'Employment': 'employment', 'EdLevel': 'ed_level', 'MainBranch': 'dev_status'}
+
+
+def encode_array(array):
+    """Encode a numpy array as its shape and base64 little-endian bytes."""
+    array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+    return {'shape': list(array.shape), 'data': base64.b64encode(array.tobytes()).decode('ascii')}
+
+
+def encode_payload(survey, charts):
+    """Encode `survey` for the clientside callbacks in assets/clientside.js.
+
+    Every filter dimension and every counted column is sent as the packed bitmaps
+    the server already uses, Country as int16 codes. `charts` maps each chart id to
+    its column, its kind, how many values it shows and a figure to fill in.
+    """
+    index = survey.filter_index
+    bitmaps = {column: matrix.bits for column, matrix in survey.tech_matrices.items()}
+    bitmaps.update({column: getattr(index, name) for column, name in INDEX_COLUMNS.items()})
+
+    labels = {column: list(matrix.labels) for column, matrix in survey.tech_matrices.items()}
+    labels.update({column: list(survey.vocabularies[column]) for column in [*INDEX_COLUMNS, 'Country']})
+
+    return {
+        'size': len(survey.years),
+        'filters': {name: encode_array(getattr(index, name)) for name in [*FILTERS, 'years_upto']},
+        'bitmaps': {column: encode_array(bits) for column, bits in bitmaps.items()},
+        'codes': {'Country': encode_array(survey.codes['Country'].astype(np.int16))},
+        'labels': labels,
+        'charts': charts,
+    }
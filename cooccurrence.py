@@ -0,0 +1,62 @@
+# Import libraries
+import numpy as np
+
+from filter_engine import sharded_sum
+from survey_data import CHUNK_ROWS, count_bits
+
+
+def cooccurrence_counts(bitmaps, rows, chunk_rows=CHUNK_ROWS):
+    """Return the co-occurrence counts of every pair of columns among the packed `rows`.
+
+    `bitmaps` maps each column to its packed (values, bytes) bitmaps. The result
+    maps every (column, other) pair to the (values, other values) counts of the
+    respondents in `rows` set in both bitmaps, the product of the two unpacked
+    incidence matrices. Respondents are unpacked one chunk at a time.
+    """
+    columns = list(bitmaps)
+    counts = {(column, other): np.zeros((len(bitmaps[column]), len(bitmaps[other])), dtype=np.int64)
+              for i, column in enumerate(columns) for other in columns[i:]}
+
+    for start in range(0, len(rows), chunk_rows // 8):
+        stop = start + chunk_rows // 8
+
+        # float32 products are exact up to 2**24 respondents per chunk
+        chunk = {column: np.unpackbits(bits[:, start:stop] & rows[start:stop], axis=1).astype(np.float32)
+                 for column, bits in bitmaps.items()}
+        for column, other in counts:
+            counts[column, other] += (chunk[column] @ chunk[other].T).astype(np.int64)
+
+    # The matrix of (other, column) is the transpose of (column, other)
+    counts.update({(other, column): matrix.T for (column, other), matrix in list(counts.items())})
+    return counts
+
+
+class CoOccurrence:
+    """Which technologies the respondents using a given technology also use.
+
+    The counts of every pair of `columns` among the respondents the dashboard opens
+    with, `rows`, are multiplied out once at load time, so drilling into a
+    technology without touching the filters is a lookup. Under any other filters
+    the technology's bitmap is ANDed into the filtered rows and the other column
+    counted on them: the one row of the same product the drill-down shows.
+    """
+
+    def __init__(self, survey, columns, rows):
+        self.bitmaps = {column: survey.tech_matrices[column].bits for column in columns}
+        self.codes = {column: {label: code for code, label in enumerate(survey.tech_matrices[column].labels)}
+                      for column in columns}
+        self.rows = rows
+        self.counts = cooccurrence_counts(self.bitmaps, rows)
+
+    def code(self, column, label):
+        """Return the code of the technology `label` of `column`, None when nobody uses it."""
+        return self.codes.get(column, {}).get(label)
+
+    def among(self, column, code, other, rows):
+        """Return the counts of every value of `other` among the `rows` using technology `code` of `column`."""
+        if np.array_equal(rows, self.rows):
+            return self.counts[column, other][code]
+
+        users = rows & self.bitmaps[column][code]
+        bits = self.bitmaps[other]
+        return sharded_sum(lambda start, stop: count_bits(bits[:, start:stop], users[start:stop]), len(users))
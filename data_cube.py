@@ -0,0 +1,221 @@
+# Import libraries
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+
+from filter_engine import MASK_CACHE_SIZE, count_labels
+from survey_data import (CATEGORICAL_COLUMNS, FILTERS, SNAPSHOT_FORMAT, is_fresh, packed_size, ranked_counts,
+                         save_array, selected_codes, source_fingerprint)
+
+# Cells are keyed by group * YEARS_STRIDE + YearsCode, YearsCode is stored as int8
+YEARS_STRIDE = 128
+
+# Summing one cell of a column costs about as much as counting this many bytes of
+# its packed respondent bitmaps, measured on the benchmarks/callbacks.py surveys
+CELL_BYTES = 4
+
+
+def unpack_bitmaps(bits, size):
+    """Turn a (values, ceil(size / 8)) array of packed bitmaps into a bool (values, size) array."""
+    return np.unpackbits(bits, axis=1, count=size).view(bool)
+
+
+class DataCube(NamedTuple):
+    """Counts of every charted column pre-aggregated over the filter dimensions.
+
+    Respondents are grouped by their Age, EdLevel and MainBranch codes and by the
+    combination of employments they hold. Each group has one cell per YearsCode
+    value, holding the counts for the group's respondents with at most that many
+    years of coding, so a slider range is the difference of two cells.
+    """
+
+    # Filter codes of every group
+    age: np.ndarray
+    ed_level: np.ndarray
+    dev_status: np.ndarray
+    combination: np.ndarray
+
+    # Bool (combinations, employments) array of the employments in each combination
+    combinations: np.ndarray
+
+    # Sorted group * YEARS_STRIDE + YearsCode of every cell
+    cells: np.ndarray
+
+    # Cumulative (cells, values) counts, the values of each column side by side
+    counts: np.ndarray
+
+    # First and last value of each column in `counts`
+    columns: dict
+
+
+def build_cube(survey):
+    """Pre-aggregate `survey` into a DataCube."""
+    size = len(survey.years)
+    codes = survey.codes
+    employment = unpack_bitmaps(survey.filter_index.employment, size)
+
+    # Respondents without an answer can never match the filters, leave them out
+    keep = ((codes['Age'] >= 0) & (codes['EdLevel'] >= 0) & (codes['MainBranch'] >= 0) &
+            (survey.years >= 0) & employment.any(axis=0))
+    employment = employment[:, keep]
+
+    combinations, combination = np.unique(employment.T, axis=0, return_inverse=True)
+    groups, group = np.unique(np.stack([codes['Age'][keep], codes['EdLevel'][keep],
+                                        codes['MainBranch'][keep], combination.reshape(-1)], axis=1),
+                              axis=0, return_inverse=True)
+    cells, cell = np.unique(group.reshape(-1) * YEARS_STRIDE + survey.years[keep], return_inverse=True)
+    cell = cell.reshape(-1)
+
+    # Count every value of every column per cell, unpacking one column at a time
+    blocks, columns, start = [], {}, 0
+    sources = {column: matrix.bits for column, matrix in survey.tech_matrices.items()}
+    sources['Employment'] = survey.filter_index.employment
+    for column, bits in sources.items():
+        blocks.append(np.stack([np.bincount(cell, weights=row, minlength=len(cells)).astype(np.int64)
+                                for row in unpack_bitmaps(bits, size)[:, keep]], axis=1))
+        columns[column] = (start, start + len(bits))
+        start += len(bits)
+    for column in CATEGORICAL_COLUMNS:
+        count = len(survey.vocabularies[column])
+        values = codes[column][keep]
+        answered = values >= 0
+        blocks.append(np.bincount(cell[answered] * count + values[answered],
+                                  minlength=len(cells) * count).reshape(len(cells), count))
+        columns[column] = (start, start + count)
+        start += count
+    counts = np.concatenate(blocks, axis=1)
+
+    # Accumulate over YearsCode within each group
+    counts = np.cumsum(counts, axis=0)
+    first = np.flatnonzero(np.diff(cells // YEARS_STRIDE, prepend=-1))
+    before = np.vstack([np.zeros((1, start), dtype=np.int64), counts[first[1:] - 1]])
+    counts -= np.repeat(before, np.diff(np.append(first, len(cells))), axis=0)
+
+    dtype = np.uint16 if counts.max(initial=0) <= np.iinfo(np.uint16).max else np.uint32
+    return DataCube(age=groups[:, 0].astype(np.int16), ed_level=groups[:, 1].astype(np.int16),
+                    dev_status=groups[:, 2].astype(np.int16), combination=groups[:, 3].astype(np.int32),
+                    combinations=combinations, cells=cells.astype(np.int64),
+                    counts=counts.astype(dtype), columns=columns)
+
+
+def save_cube(cube, directory, path):
+    """Write `cube`, built from the CSV at `path`, next to the snapshot in `directory`."""
+    meta_path = os.path.join(directory, 'cube.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    for name, array in cube._asdict().items():
+        if name != 'columns':
+            save_array(os.path.join(directory, f'cube-{name}.npy'), array)
+
+    with open(meta_path + '.tmp', 'w') as file:
+        json.dump({'format': SNAPSHOT_FORMAT, 'source': source_fingerprint(path), 'columns': cube.columns}, file)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def remove_cube(directory):
+    """Drop the cube of a snapshot that was rebuilt without one."""
+    meta_path = os.path.join(directory, 'cube.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+
+def load_cube(directory, path, shared=False):
+    """Load the cube in `directory`, or return None when it is missing or stale."""
+    try:
+        with open(os.path.join(directory, 'cube.json')) as file:
+            meta = json.load(file)
+    except FileNotFoundError:
+        return None
+    # A cube of an older snapshot layout may lack columns the dashboard counts
+    if meta.get('format') != SNAPSHOT_FORMAT or not is_fresh(meta['source'], path):
+        return None
+
+    arrays = {name: np.load(os.path.join(directory, f'cube-{name}.npy'), mmap_mode='r' if shared else None)
+              for name in DataCube._fields if name != 'columns'}
+    return DataCube(columns={column: tuple(bounds) for column, bounds in meta['columns'].items()}, **arrays)
+
+
+class CubeEngine:
+    """Answers the dashboard filters from a DataCube when it reads less than the bitmaps.
+
+    It has the same interface as FilterEngine, but `rows` returns the cells to add
+    and to subtract instead of a respondent bitmap. A group holds few respondents,
+    so a broad selection such as the one the page opens with matches more cells
+    than a pass over the respondent bitmaps reads; those are handed to `filters`,
+    whose bitmap `rows` returns instead. The groups of every filter dimension are
+    memoized on its selection, so telling the two apart stays cheap.
+    """
+
+    def __init__(self, survey, cube, filters):
+        self.cube = cube
+        self.filters = filters
+        self.width = packed_size(len(survey.years))
+        self.labels = count_labels(survey)
+        self.sizes = {column: len(vocabulary) for column, vocabulary in survey.vocabularies.items()}
+        self.masks = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _groups(self, name, values):
+        """Return the memoized mask of the groups with one of the selected codes of a filter dimension."""
+        count = self.sizes[FILTERS[name]]
+        codes = selected_codes(values, count)
+        key = (name, tuple(codes))
+        with self.lock:
+            if key in self.masks:
+                self.masks.move_to_end(key)
+                return self.masks[key]
+
+        selected = np.zeros(count, dtype=bool)
+        selected[codes] = True
+        if name == 'employment':
+            # A combination matches when any of its employments is selected
+            mask = (self.cube.combinations & selected).any(axis=1)[self.cube.combination]
+        else:
+            mask = selected[getattr(self.cube, name)]
+
+        with self.lock:
+            self.masks[key] = mask
+            if len(self.masks) > MASK_CACHE_SIZE:
+                self.masks.popitem(last=False)
+        return mask
+
+    def _last_cells(self, groups, year):
+        """Return each group's last cell with at most `year` years of coding, if any."""
+        if year < 0:
+            return np.empty(0, dtype=np.intp)
+        keys = groups * YEARS_STRIDE + min(int(year), YEARS_STRIDE - 1)
+        cells = np.searchsorted(self.cube.cells, keys, side='right') - 1
+        found = cells >= 0
+        found[found] = self.cube.cells[cells[found]] // YEARS_STRIDE == groups[found]
+        return cells[found]
+
+    def rows(self, age, ed_level, employ_status, dev_status, years_code):
+        """Return the (added, subtracted) cells matching every filter, or the bitmap of `filters`."""
+        groups = np.flatnonzero(self._groups('age', age) & self._groups('ed_level', ed_level) &
+                                self._groups('employment', employ_status) &
+                                self._groups('dev_status', dev_status))
+
+        # Every group adds at most one cell, and subtracts at most one more when the range
+        # starts above 0; past a bitmap pass worth of cells, hand the selection to `filters`
+        low, high = years_code
+        if len(groups) * (1 + (low > 0)) * CELL_BYTES > self.width:
+            return self.filters.rows(age, ed_level, employ_status, dev_status, years_code)
+        return self._last_cells(groups, high), self._last_cells(groups, int(np.ceil(low)) - 1)
+
+    def counts(self, column, rows):
+        """Return the counts of every value of `column` for the cells or the bitmap from `rows`."""
+        if not isinstance(rows, tuple):
+            return self.filters.counts(column, rows)
+        added, subtracted = rows
+        start, stop = self.cube.columns[column]
+        return (self.cube.counts[added, start:stop].sum(axis=0, dtype=np.int64) -
+                self.cube.counts[subtracted, start:stop].sum(axis=0, dtype=np.int64))
+
+    def ranked(self, column, rows, n=None):
+        """Return the top `n` values of `column` for the cells or the bitmap from `rows`, see ranked_counts."""
+        return ranked_counts(self.labels[column], self.counts(column, rows), column, n)
@@ -0,0 +1,94 @@
+# Import libraries
+import logging
+import os
+import threading
+import time
+
+from survey_data import DATA_PATH, SNAPSHOT_DIR
+
+logger = logging.getLogger(__name__)
+
+# Year of the survey at SURVEY_DATA_PATH when SURVEY_YEARS is not set
+DEFAULT_YEAR = '2024'
+
+
+def parse_years(value):
+    """Parse `year=path` pairs separated by commas into a {year: path} dict, newest year first."""
+    years = {}
+    for pair in value.split(','):
+        if pair.strip():
+            year, path = pair.split('=', 1)
+            years[year.strip()] = path.strip()
+    return dict(sorted(years.items(), reverse=True)) or {DEFAULT_YEAR: DATA_PATH}
+
+
+# The cleaned survey CSV of every year served, e.g. "2024=clean_survey_data.csv,2023=survey_2023.csv"
+SURVEY_YEARS = parse_years(os.environ.get('SURVEY_YEARS', ''))
+
+# Unload a year nobody asked for in this many seconds, 0 keeps every year loaded
+IDLE_SECONDS = float(os.environ.get('SURVEY_IDLE_SECONDS', 30 * 60))
+
+
+def partition_dir(year, snapshot_dir=SNAPSHOT_DIR):
+    """Return the snapshot directory of the survey of `year`."""
+    return os.path.join(snapshot_dir, year)
+
+
+class DatasetStore:
+    """Survey partitions, one per year, loaded on first use and unloaded when idle.
+
+    `load(year, path)` builds the partition of a year from the CSV at `path`. A
+    year is only read once it is asked for, so memory and startup time grow with
+    the years actually viewed rather than with every year served. The newest
+    year, which the page opens with and the workers warm up, is never unloaded.
+    """
+
+    def __init__(self, load, years=SURVEY_YEARS, idle_seconds=IDLE_SECONDS):
+        self.load = load
+        self.years = years
+        self.idle_seconds = idle_seconds
+        self.pinned = next(iter(years), None)
+        self.partitions = {}
+        self.used = {}
+        self.lock = threading.Lock()
+
+        # One lock per year, so two requests never load the same year twice
+        # while loading one year does not block the others
+        self.loading = {year: threading.Lock() for year in years}
+
+    def get(self, year):
+        """Return the partition of `year`, loading it when needed."""
+        if year not in self.years:
+            raise KeyError(f'No survey for year {year!r}')
+
+        now = time.monotonic()
+        with self.lock:
+            self.used[year] = now
+            self._evict(now)
+            partition = self.partitions.get(year)
+        if partition is not None:
+            return partition
+
+        with self.loading[year]:
+            with self.lock:
+                partition = self.partitions.get(year)
+            if partition is None:
+                logger.info('Loading the %s survey from %s', year, self.years[year])
+                partition = self.load(year, self.years[year])
+                with self.lock:
+                    self.partitions[year] = partition
+        return partition
+
+    def _evict(self, now):
+        """Drop the partitions idle for longer than idle_seconds, holding the lock."""
+        if self.idle_seconds <= 0:
+            return
+        for year in list(self.partitions):
+            if year != self.pinned and now - self.used[year] > self.idle_seconds:
+                logger.info('Unloading the %s survey, idle for %.0f s', year, now - self.used[year])
+                del self.partitions[year]
+
+    def loaded(self):
+        """Return the years currently loaded."""
+        with self.lock:
+            return list(self.partitions)
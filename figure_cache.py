@@ -0,0 +1,152 @@
+# Import libraries
+import functools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import plotly
+
+from metrics import timed
+
+# Where the cache lives and how large it may grow, shared by every worker on the host
+CACHE_PATH = os.environ.get('FIGURE_CACHE_PATH',
+                            os.path.join(tempfile.gettempdir(), 'dev-survey-dashboard-cache.sqlite3'))
+CACHE_MAX_BYTES = int(os.environ.get('FIGURE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Least recently used entries read at a time while evicting
+EVICT_BATCH = 64
+
+
+def make_key(*args):
+    """Normalize callback arguments into a cache key.
+
+    Lists are sorted so the order values were picked in a dropdown does not matter,
+    and dict keys so a component id matches however the browser ordered it. Values
+    are sorted by their repr, so a list mixing types (e.g. a missing label) still sorts.
+    """
+    return json.dumps([sorted(arg, key=repr) if isinstance(arg, list) else arg for arg in args], sort_keys=True)
+
+
+class FigureCache:
+    """Byte-bounded LRU cache of serialized figure payloads.
+
+    Entries are kept in a SQLite file so all gunicorn workers on a host read and
+    fill the same cache. Every entry is tagged with `version`, so a cache file left
+    over from another dataset is never served. The total size of the entries is
+    kept in the `bytes` counter, so a put never scans the whole table.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, version=''):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = version + ':'
+        self._local = threading.local()
+        os.register_at_fork(after_in_child=self._forget_connections)
+
+        db = self._connect()
+        db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                   'key TEXT PRIMARY KEY, payload BLOB NOT NULL, '
+                   'size INTEGER NOT NULL, used REAL NOT NULL)')
+        db.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+        db.execute('CREATE TABLE IF NOT EXISTS counters ('
+                   'name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        db.execute("INSERT OR IGNORE INTO counters SELECT 'bytes', COALESCE(SUM(size), 0) FROM entries")
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def _forget_connections(self):
+        """Open new connections in a forked worker, SQLite connections must not cross a fork."""
+        self._local = threading.local()
+
+    def _count(self, db, name, amount=1):
+        db.execute('INSERT INTO counters VALUES (?, ?) '
+                   'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                   (name, amount))
+
+    def get(self, key):
+        """Return the cached payload for `key`, or None on a miss."""
+        db = self._connect()
+        key = self.version + key
+        row = db.execute('SELECT payload FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self._count(db, 'misses')
+            return None
+
+        db.execute('UPDATE entries SET used = ? WHERE key = ?', (time.time(), key))
+        self._count(db, 'hits')
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """Serialize `value` into the cache and evict the least recently used entries."""
+        payload = json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder).encode()
+        if len(payload) > self.max_bytes:
+            return
+
+        db = self._connect()
+        key = self.version + key
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            replaced = db.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                       (key, payload, len(payload), time.time()))
+            self._count(db, 'bytes', len(payload) - (replaced[0] if replaced else 0))
+
+            # Drop the oldest entries until the cache fits in max_bytes again,
+            # reading them a batch at a time from the index on `used`
+            excess = db.execute("SELECT value FROM counters WHERE name = 'bytes'").fetchone()[0] - self.max_bytes
+            evicted = freed = 0
+            while excess > freed:
+                oldest = db.execute('SELECT key, size FROM entries ORDER BY used LIMIT ?', (EVICT_BATCH,)).fetchall()
+                if not oldest:
+                    break
+                for old_key, size in oldest:
+                    db.execute('DELETE FROM entries WHERE key = ?', (old_key,))
+                    evicted += 1
+                    freed += size
+                    if excess <= freed:
+                        break
+            if evicted:
+                self._count(db, 'evictions', evicted)
+                self._count(db, 'bytes', -freed)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def stats(self):
+        """Return the hit/miss/eviction counters and the current cache size."""
+        db = self._connect()
+        stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+        stats.update(db.execute('SELECT name, value FROM counters').fetchall())
+        stats['entries'] = db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        return stats
+
+    def memoize(self, function):
+        """Cache the return value of a Dash callback keyed on its normalized arguments."""
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            if self.max_bytes <= 0:
+                return function(*args)
+
+            key = function.__name__ + make_key(*args)
+            with timed('cache-get'):
+                value = self.get(key)
+            if value is None:
+                value = function(*args)
+                with timed('cache-put'):
+                    self.put(key, value)
+            return value
+
+        return wrapper
@@ -0,0 +1,143 @@
+# Import libraries
+import logging
+
+import plotly.graph_objects as go
+import plotly.io as pio
+import pycountry
+from dash import Patch
+
+logger = logging.getLogger(__name__)
+
+# Trace attributes each kind of chart fills in: (names, values)
+DATA_FIELDS = {'bar': ('x', 'y'), 'barh': ('y', 'x'), 'pie': ('labels', 'values'), 'map': ('text', 'z'),
+               'compare': ('x', 'y')}
+
+# Kinds of chart with several traces over the same names, filled in with one array of values per trace
+GROUPED_KINDS = {'compare'}
+
+# Survey country names that pycountry does not know, or knows under another name
+COUNTRY_CODES = {
+    'Republic of Korea': 'KOR',
+    'Hong Kong (S.A.R.)': 'HKG',
+    'The former Yugoslav Republic of Macedonia': 'MKD',
+    'Libyan Arab Jamahiriya': 'LBY',
+    'Congo, Republic of the...': 'COG',
+    'Democratic Republic of the Congo': 'COD',
+    'Palestine': 'PSE',
+    'Turkey': 'TUR',
+    'Swaziland': 'SWZ',
+    'Cape Verde': 'CPV',
+}
+
+
+def country_codes(names):
+    """Return the ISO-3 code of every country name, None for the ones without a code."""
+    codes = []
+    for name in names:
+        code = COUNTRY_CODES.get(name)
+        if code is None:
+            try:
+                # The survey cuts some official names short with "..."
+                code = pycountry.countries.lookup(name.rstrip('. ')).alpha_3
+            except LookupError:
+                logger.warning('No ISO-3 code for country %r, it is left off the map', name)
+        codes.append(code)
+    return codes
+
+
+def bar_figure(label, horizontal=False):
+    """Return the empty bar chart of the top values of `label`, like px.bar draws it."""
+    color = pio.templates[pio.templates.default].layout.colorway[0]
+    x, y = ('Count', label) if horizontal else (label, 'Count')
+    fig = go.Figure(go.Bar(name='', orientation='h' if horizontal else 'v', marker_color=color,
+                           hovertemplate=f'{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>'))
+    fig.update_layout(barmode='relative', margin_t=60, xaxis_title_text=x, yaxis_title_text=y)
+
+    # Most popular first, from the top
+    if horizontal:
+        fig.update_yaxes(autorange='reversed')
+    return fig
+
+
+def pie_figure(label):
+    """Return the empty pie chart of the distribution of `label`, without a legend."""
+    fig = go.Figure(go.Pie(name='', hovertemplate=f'{label}=%{{label}}<br>Count=%{{value}}<extra></extra>'))
+    fig.update_layout(margin_t=60, showlegend=False)
+    return fig
+
+
+def compare_figure(label):
+    """Return the empty chart of the technologies `label` used and desired, with the share of users keeping them.
+
+    Used and desired counts are grouped bars, the share kept is a marker on a
+    percentage axis to the right.
+    """
+    colors = pio.templates[pio.templates.default].layout.colorway
+    fig = go.Figure([
+        go.Bar(name='Used', marker_color=colors[0],
+               hovertemplate=f'{label}=%{{x}}<br>Used=%{{y}}<extra></extra>'),
+        go.Bar(name='Desired', marker_color=colors[1],
+               hovertemplate=f'{label}=%{{x}}<br>Desired=%{{y}}<extra></extra>'),
+        go.Scatter(name='Want to keep using (%)', mode='markers', yaxis='y2',
+                   marker=dict(color=colors[3], size=10),
+                   hovertemplate=f'{label}=%{{x}}<br>%{{y}}% of its users want to keep using it<extra></extra>'),
+    ])
+    fig.update_layout(barmode='group', margin_t=60, xaxis_title_text=label, yaxis_title_text='Count',
+                      yaxis2=dict(title_text='Want to keep using (%)', overlaying='y', side='right',
+                                  range=[0, 100], showgrid=False),
+                      legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1))
+    return fig
+
+
+def map_figure(label, names, codes):
+    """Return the choropleth of the countries `names` at their ISO-3 `codes`, without counts yet.
+
+    The countries never change, so filters only have to patch in the counts.
+    """
+    colorscale = pio.templates[pio.templates.default].layout.colorscale.sequential
+    fig = go.Figure(go.Choropleth(name='', locationmode='ISO-3', locations=codes, text=names,
+                                  z=[None] * len(codes), coloraxis='coloraxis',
+                                  hovertemplate=f'{label}=%{{text}}<br>Count=%{{z}}<extra></extra>'))
+    fig.update_layout(margin_t=60, coloraxis_colorscale=colorscale, coloraxis_colorbar_title_text='Count')
+    return fig
+
+
+def skeleton(fig):
+    """Return `fig` as a plain dict, keeping only the template defaults of its own trace types."""
+    fig = fig.to_plotly_json()
+    template = fig['layout']['template']
+    types = {trace['type'] for trace in fig['data']}
+    template['data'] = {kind: traces for kind, traces in template['data'].items() if kind in types}
+    return fig
+
+
+class FigureFactory:
+    """Figures of every chart built once, patched with the data of each request.
+
+    `charts` maps each chart id to its kind (one of DATA_FIELDS) and an empty
+    go.Figure. The figures are validated, template-merged and converted to plain
+    dicts up front and laid out with their graph, carrying the template defaults
+    of a single trace type. A request then only sends the two arrays that change.
+    """
+
+    def __init__(self, charts):
+        self.charts = {chart: (kind, skeleton(fig)) for chart, (kind, fig) in charts.items()}
+
+    def empty(self, chart):
+        """Return the figure of `chart` before any data is filled in."""
+        return self.charts[chart][1]
+
+    def patch(self, chart, names, values):
+        """Return a Patch setting the `names` and `values` of `chart` on a graph showing its empty figure.
+
+        With `names` None only the values are replaced, for charts whose names are fixed.
+        Charts of the GROUPED_KINDS take a list of `values`, one per trace.
+        """
+        kind, _ = self.charts[chart]
+        names_field, values_field = DATA_FIELDS[kind]
+        patch = Patch()
+        for trace, trace_values in enumerate(values if kind in GROUPED_KINDS else [values]):
+            if names is not None:
+                patch['data'][trace][names_field] = names
+            patch['data'][trace][values_field] = trace_values
+        return patch
@@ -0,0 +1,185 @@
+# Import libraries
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from survey_data import (CATEGORICAL_COLUMNS, FILTERS, POPCOUNT, any_of, count_bits, ranked_counts,
+                         selected_codes, unpack_rows, years_between)
+
+# How many per-dimension masks and previous counts each worker keeps around
+MASK_CACHE_SIZE = 64
+RECENT_COUNTS = 4
+
+# Reuse previous counts while fewer than 1 in DELTA_RATIO respondents changed,
+# past that a full popcount is cheaper than reading the changed rows one by one
+DELTA_RATIO = 64
+
+# Threads counting the shards of one column. NumPy releases the GIL while it
+# counts, so the shards of a large survey run on separate cores
+COUNT_THREADS = int(os.environ.get('SURVEY_COUNT_THREADS', os.cpu_count() or 1))
+
+# Respondents per shard, smaller surveys are counted in the calling thread
+SHARD_ROWS = int(os.environ.get('SURVEY_SHARD_ROWS', 1 << 17))
+
+# Started on the first sharded count, in every worker process
+pool = None
+pool_lock = threading.Lock()
+
+
+def count_pool():
+    """Return the thread pool counting shards, starting it when needed."""
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = ThreadPoolExecutor(COUNT_THREADS, thread_name_prefix='count')
+        return pool
+
+
+def forget_pool():
+    """Start over in a forked worker, which does not inherit the threads of the pool."""
+    global pool, pool_lock
+    pool = None
+    pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=forget_pool)
+
+
+def sharded_sum(count, width):
+    """Return the sum of `count(start, stop)` over shards of `width` packed bytes of respondents.
+
+    Surveys of at least two shards are split into up to COUNT_THREADS shards of
+    about equal size, counted on the pool and merged.
+    """
+    shards = min(COUNT_THREADS, width * 8 // SHARD_ROWS)
+    if shards <= 1:
+        return count(0, width)
+    bounds = np.linspace(0, width, shards + 1).astype(np.int64)
+    return sum(count_pool().map(count, bounds[:-1], bounds[1:]))
+
+
+def count_labels(survey):
+    """Return the labels of the counts of every countable column."""
+    labels = {column: matrix.labels for column, matrix in survey.tech_matrices.items()}
+    labels.update({column: survey.vocabularies[column] for column in ['Employment', *CATEGORICAL_COLUMNS]})
+    return labels
+
+
+def count_rows(bits, indices):
+    """Count how many of the respondents `indices` are set in each row of `bits`."""
+    shifts = (7 - (indices & 7)).astype(np.uint8)
+    return ((bits[:, indices >> 3] >> shifts) & 1).sum(axis=-1, dtype=np.int64)
+
+
+class FilterEngine:
+    """Incremental filter evaluation over a SurveyData.
+
+    The mask of every filter dimension is memoized on its selection, so when a
+    single dropdown changes only that dimension's bitmap is rebuilt and ANDed with
+    the cached others. Counts are updated from the most similar recent evaluation
+    by adding the respondents that entered the filter and subtracting the ones that
+    left, falling back to a full count when too many respondents changed. Full
+    counts of large surveys are sharded over the count pool, see sharded_sum.
+    """
+
+    def __init__(self, survey):
+        self.index = survey.filter_index
+        self.size = len(survey.years)
+
+        # Every countable column as bitmaps, the filter dimensions reuse the filter
+        # index so counting them never unpacks the rows; Country is only kept as codes
+        self.bitmaps = {column: matrix.bits for column, matrix in survey.tech_matrices.items()}
+        self.bitmaps.update({column: getattr(survey.filter_index, name) for name, column in FILTERS.items()})
+        self.codes = {column: (survey.codes[column], len(survey.vocabularies[column]))
+                      for column in CATEGORICAL_COLUMNS if column not in self.bitmaps}
+
+        self.labels = count_labels(survey)
+
+        self.masks = OrderedDict()
+        self.recent = {column: deque(maxlen=RECENT_COUNTS) for column in [*self.bitmaps, *self.codes]}
+        self.lock = threading.Lock()
+
+    def _mask(self, name, values):
+        """Return the memoized bitmap of one filter dimension."""
+
+        # Keyed on the valid codes, so dropdown order or a stray value never misses the memo
+        if name != 'years':
+            values = selected_codes(values, len(getattr(self.index, name)))
+        key = (name, tuple(values or []))
+        with self.lock:
+            if key in self.masks:
+                self.masks.move_to_end(key)
+                return self.masks[key]
+
+        if name == 'years':
+            mask = years_between(self.index, values)
+        else:
+            mask = any_of(getattr(self.index, name), values)
+
+        with self.lock:
+            self.masks[key] = mask
+            if len(self.masks) > MASK_CACHE_SIZE:
+                self.masks.popitem(last=False)
+        return mask
+
+    def rows(self, age, ed_level, employ_status, dev_status, years_code):
+        """Return the packed bitmap of respondents matching every filter."""
+        rows = self._mask('age', age).copy()
+        rows &= self._mask('ed_level', ed_level)
+        rows &= self._mask('employment', employ_status)
+        rows &= self._mask('dev_status', dev_status)
+        rows &= self._mask('years', years_code)
+        return rows
+
+    def _count(self, column, rows=None, indices=None):
+        """Count `column` within the packed `rows`, or over the respondent `indices`."""
+        if column in self.bitmaps:
+            bits = self.bitmaps[column]
+            if indices is None:
+                return sharded_sum(lambda start, stop: count_bits(bits[:, start:stop], rows[start:stop]),
+                                   len(rows))
+            return count_rows(bits, indices)
+
+        codes, count = self.codes[column]
+        if indices is None:
+            def count_shard(start, stop):
+                shard = codes[start * 8:stop * 8]
+                shard = shard[unpack_rows(rows[start:stop], len(shard))]
+                return np.bincount(shard[shard >= 0], minlength=count)
+            return sharded_sum(count_shard, len(rows))
+        codes = codes[indices]
+        return np.bincount(codes[codes >= 0], minlength=count)
+
+    def counts(self, column, rows):
+        """Return the counts of every value of `column` among the packed `rows`."""
+        with self.lock:
+            recent = list(self.recent[column])
+
+        # Start from the previous evaluation that differs in the fewest respondents
+        best = None
+        if recent:
+            changes = [int(POPCOUNT[previous ^ rows].sum()) for previous, _ in recent]
+            closest = int(np.argmin(changes))
+            if changes[closest] * DELTA_RATIO <= self.size:
+                best = recent[closest]
+
+        if best is None:
+            counts = self._count(column, rows)
+        elif changes[closest] == 0:
+            return best[1]
+        else:
+            previous, counts = best
+            added = np.flatnonzero(unpack_rows(rows & ~previous, self.size))
+            removed = np.flatnonzero(unpack_rows(previous & ~rows, self.size))
+            counts = counts + self._count(column, indices=added) - self._count(column, indices=removed)
+
+        with self.lock:
+            self.recent[column].append((rows, counts))
+        return counts
+
+    def ranked(self, column, rows, n=None):
+        """Return the top `n` values of `column` among the packed `rows`, see ranked_counts."""
+        return ranked_counts(self.labels[column], self.counts(column, rows), column, n)
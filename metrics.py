@@ -0,0 +1,147 @@
+# Import libraries
+import contextlib
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+
+# Upper bounds in seconds of the histogram buckets, from 0.1 ms to 10 s
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_value(value):
+    """Format a number the way the Prometheus text format expects."""
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+
+class Histogram:
+    """Prometheus histogram of durations in seconds, one series per label value."""
+
+    def __init__(self, name, documentation, label, buckets=BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = (*buckets, float('inf'))
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, seconds):
+        """Record `seconds` in the series of the label `value`."""
+        with self.lock:
+            counts, total = self.series.get(value, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            self.series[value] = (counts, total + seconds)
+
+    def render(self):
+        """Return the histogram in the Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for value, (counts, total) in sorted(self.series.items()):
+                label = f'{self.label}="{value}"'
+                lines += [f'{self.name}_bucket{{{label},le="{format_value(bound)}"}} {count}'
+                          for bound, count in zip(self.buckets, counts)]
+                lines += [f'{self.name}_sum{{{label}}} {format_value(total)}',
+                          f'{self.name}_count{{{label}}} {counts[-1]}']
+        return lines
+
+
+class Gauge:
+    """Prometheus gauge holding the last value set, one series per label value."""
+
+    def __init__(self, name, documentation, label):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, seconds):
+        """Set the series of the label `value` to `seconds`."""
+        with self.lock:
+            self.series[value] = seconds
+
+    def render(self):
+        """Return the gauge in the Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        with self.lock:
+            lines += [f'{self.name}{{{self.label}="{value}"}} {format_value(seconds)}'
+                      for value, seconds in sorted(self.series.items())]
+        return lines
+
+
+class Collected:
+    """Prometheus metric read from `collect` when scraped, for values kept elsewhere.
+
+    `collect` returns a dict of label value to value, e.g. the counters of a cache.
+    """
+
+    def __init__(self, name, documentation, kind, label, collect):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.label = label
+        self.collect = collect
+
+    def render(self):
+        """Return the values collected now in the Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines += [f'{self.name}{{{self.label}="{value}"}} {format_value(number)}'
+                  for value, number in sorted(self.collect().items())]
+        return lines
+
+
+# Metrics of this worker process, scraped from /metrics
+STAGES = Histogram('dashboard_stage_seconds', 'Time spent in each stage of the chart callbacks.', 'stage')
+REQUESTS = Histogram('dashboard_request_seconds', 'Time spent answering each HTTP route.', 'route')
+STARTUP = Gauge('dashboard_startup_seconds', 'Time spent in each stage of the startup.', 'stage')
+METRICS = [STAGES, REQUESTS, STARTUP]
+
+
+@contextlib.contextmanager
+def timed(stage, metric=STAGES):
+    """Record how long the block takes as `stage` of `metric`.
+
+    Inside a request the duration is also added to its Server-Timing header.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        metric.observe(stage, seconds)
+        if has_request_context():
+            g.setdefault('stages', []).append((stage, seconds))
+
+
+def render():
+    """Return every metric in the Prometheus text format."""
+    return '\n'.join(line for metric in METRICS for line in metric.render()) + '\n'
+
+
+def init_app(server):
+    """Serve /metrics on the Flask `server` and add a Server-Timing header to its responses."""
+
+    @server.before_request
+    def start_timer():
+        g.start = time.perf_counter()
+
+    @server.after_request
+    def add_server_timing(response):
+        if 'start' not in g:
+            return response
+        seconds = time.perf_counter() - g.start
+
+        # Label by the URL rule, so the number of series stays bounded
+        REQUESTS.observe(request.url_rule.rule if request.url_rule else 'unmatched', seconds)
+
+        # Durations in milliseconds, shown by the browser devtools under Timing
+        stages = [*g.get('stages', []), ('total', seconds)]
+        response.headers['Server-Timing'] = ', '.join(f'{stage};dur={seconds * 1000:.2f}'
+                                                      for stage, seconds in stages)
+        return response
+
+    @server.route('/metrics')
+    def metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,470 @@
+# Import libraries
+import hashlib
+import json
+import logging
+import os
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Where the cleaned survey and its prebuilt snapshot live
+DATA_PATH = os.environ.get('SURVEY_DATA_PATH', 'clean_survey_data.csv')
+SNAPSHOT_DIR = os.environ.get('SURVEY_SNAPSHOT_DIR', 'survey_snapshot')
+
+# Memory-map the snapshot read-only so every worker on the host shares one copy
+SHARED_DATA = os.environ.get('SURVEY_SHARED_DATA', '0') == '1'
+
+# Bump whenever the snapshot layout changes so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 4
+
+# Respondents parsed at a time when reading the CSV, a multiple of 8 so every
+# chunk packs into whole bitmap bytes. Peak memory follows it, not the file size
+CHUNK_ROWS = int(os.environ.get('SURVEY_CHUNK_ROWS', 1 << 16)) // 8 * 8 or 8
+
+# Columns of the survey used by the dashboard
+COLUMNS = ['MainBranch', 'Age', 'Employment',
+           'EdLevel', 'YearsCode', 'Country',
+           'LanguageHaveWorkedWith', 'LanguageWantToWorkWith', 'DatabaseHaveWorkedWith',
+           'DatabaseWantToWorkWith', 'PlatformHaveWorkedWith', 'PlatformWantToWorkWith',
+           'WebframeHaveWorkedWith', 'WebframeWantToWorkWith', 'ToolsTechHaveWorkedWith',
+           'ToolsTechWantToWorkWith', 'NEWCollabToolsHaveWorkedWith', 'NEWCollabToolsWantToWorkWith']
+
+# Single choice columns stored as small integer codes
+CATEGORICAL_COLUMNS = ['MainBranch', 'Age', 'EdLevel', 'Country']
+
+# Filter dimensions of the FilterIndex and the column each one is built from
+FILTERS = {'age': 'Age', 'ed_level': 'EdLevel', 'employment': 'Employment', 'dev_status': 'MainBranch'}
+
+# Single choice filter columns whose unanswered respondents get a NOT_ANSWERED entry,
+# so the dropdowns select them by default like the NaN option of the original lists
+UNANSWERED_COLUMNS = ['Age', 'EdLevel', 'MainBranch']
+NOT_ANSWERED = 'Not answered'
+
+# Multi-select technology columns plotted on each tab
+TECH_COLUMNS = {
+    'tech-used': ['LanguageHaveWorkedWith', 'DatabaseHaveWorkedWith',
+                  'WebframeHaveWorkedWith', 'NEWCollabToolsHaveWorkedWith'],
+    'tech-want': ['LanguageWantToWorkWith', 'DatabaseWantToWorkWith',
+                  'WebframeWantToWorkWith', 'NEWCollabToolsWantToWorkWith'],
+}
+
+# Respondents who have worked with a technology and want to keep working with it, one
+# column per category, from its HaveWorkedWith and WantToWorkWith columns
+RETAINED_COLUMNS = {have.replace('HaveWorkedWith', 'Retained'): (have, want)
+                    for have, want in zip(TECH_COLUMNS['tech-used'], TECH_COLUMNS['tech-want'])}
+
+# Semicolon separated columns stored as packed respondent bitmaps
+MULTI_SELECT_COLUMNS = ['Employment', *(column for columns in TECH_COLUMNS.values() for column in columns)]
+
+# Number of set bits for every possible byte value
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class FilterIndex(NamedTuple):
+    """Inverted index from every filter code to a packed respondent bitmap.
+
+    The dropdown fields are uint8 arrays of shape (values, ceil(respondents / 8))
+    whose row `i` holds the respondents answering vocabulary entry `i`.
+    """
+
+    age: np.ndarray
+    ed_level: np.ndarray
+    employment: np.ndarray
+    dev_status: np.ndarray
+
+    # Row `y` holds the respondents with at most `y` years of coding
+    years_upto: np.ndarray
+
+
+class SurveyData(NamedTuple):
+    """Everything the dashboard reads from the survey, ready to be filtered."""
+
+    # Labels of every encoded column in display order, shared with the dropdowns
+    vocabularies: dict
+
+    # int8/int16 codes of the CATEGORICAL_COLUMNS, -1 when unanswered outside UNANSWERED_COLUMNS
+    codes: dict
+
+    # Whole years of coding as int8, -1 when unanswered
+    years: np.ndarray
+    filter_index: FilterIndex
+
+    # TechMatrix of every column in TECH_COLUMNS and RETAINED_COLUMNS
+    tech_matrices: dict
+
+
+class TechMatrix(NamedTuple):
+    """Bit-packed technology x row matrix for one multi-select column."""
+
+    # Technology names, one per matrix row
+    labels: np.ndarray
+
+    # uint8 array of shape (technologies, ceil(rows / 8)), one bit per respondent
+    bits: np.ndarray
+
+
+def packed_size(count):
+    """Return the bytes of a packed bitmap of `count` respondents."""
+    return (count + 7) // 8
+
+
+def code_dtype(vocabulary):
+    """Return the int8/int16 type holding the codes of `vocabulary` and -1, like pd.Categorical."""
+    return np.int8 if len(vocabulary) < np.iinfo(np.int8).max else np.int16
+
+
+def order_vocabularies(labels):
+    """Return the labels of every encoded column in the order the dropdowns show them.
+
+    `labels` holds the labels of each column in the order they first appear.
+    """
+
+    # Sorted age ranges, moving "Under 18" in front
+    ages = sorted(labels['Age'])
+    ages.insert(0, ages.pop())
+
+    return {'Age': ages,
+            'EdLevel': sorted(labels['EdLevel']),
+            'Employment': sorted(labels['Employment']),
+            'MainBranch': list(labels['MainBranch']),
+            'Country': sorted(labels['Country'])}
+
+
+def encode_years(column):
+    """Return YearsCode as whole years in an int8 array, -1 when missing or not a number."""
+    years = pd.to_numeric(column, errors='coerce').to_numpy(dtype=float)
+    return np.where(np.isnan(years), -1, np.clip(years, 0, 127)).astype(np.int8)
+
+
+def build_bitmaps(codes, count, chunk_rows=CHUNK_ROWS):
+    """Return the packed respondent bitmap of each of the `count` codes."""
+    bitmaps = np.empty((count, packed_size(len(codes))), dtype=np.uint8)
+
+    # One chunk at a time, so the unpacked booleans never outgrow a chunk
+    for start in range(0, len(codes), chunk_rows):
+        chunk = codes[start:start + chunk_rows]
+        bitmaps[:, start // 8:packed_size(start + len(chunk))] = np.packbits(
+            chunk[np.newaxis, :] == np.arange(count)[:, np.newaxis], axis=1)
+    return bitmaps
+
+
+def build_years_upto(years, chunk_rows=CHUNK_ROWS):
+    """Return the bitmaps whose row `y` holds the respondents with at most `y` years of coding."""
+    top = max(int(years.max(initial=0)), 0)
+    years_upto = np.empty((top + 1, packed_size(len(years))), dtype=np.uint8)
+
+    # Bucket YearsCode by year and accumulate the buckets,
+    # so a range query only needs two bitmaps
+    for start in range(0, len(years), chunk_rows):
+        chunk = years[start:start + chunk_rows]
+        buckets = np.zeros((top + 1, len(chunk)), dtype=bool)
+        known = chunk >= 0
+        buckets[chunk[known], np.flatnonzero(known)] = True
+        years_upto[:, start // 8:packed_size(start + len(chunk))] = np.packbits(
+            np.logical_or.accumulate(buckets, axis=0), axis=1)
+    return years_upto
+
+
+def build_retained(tech_matrices):
+    """Return the TechMatrix of every column in RETAINED_COLUMNS.
+
+    Its rows follow the technologies of the HaveWorkedWith column, so the share of
+    users keeping a technology is a ratio of two counts at the same position.
+    """
+    retained = {}
+    for column, (have, want) in RETAINED_COLUMNS.items():
+        used, desired = tech_matrices[have], tech_matrices[want]
+        position = {label: i for i, label in enumerate(desired.labels)}
+        bits = np.zeros_like(used.bits)
+        for i, label in enumerate(used.labels):
+            if label in position:
+                np.bitwise_and(used.bits[i], desired.bits[position[label]], out=bits[i])
+        retained[column] = TechMatrix(labels=used.labels, bits=bits)
+    return retained
+
+
+class Vocabulary:
+    """Labels of one column, numbered in the order they first appear in the CSV."""
+
+    def __init__(self):
+        self.codes = {}
+
+    def add(self, labels):
+        """Return the code of every label, numbering the new ones."""
+        return np.array([self.codes.setdefault(label, len(self.codes)) for label in labels], dtype=np.int64)
+
+    def order(self, labels):
+        """Return the position in `labels` of every code, followed by -1 for the missing code -1."""
+        position = {label: i for i, label in enumerate(labels)}
+        return np.array([position[label] for label in self.codes] + [-1], dtype=np.int64)
+
+
+class SurveyReader:
+    """Builds SurveyData from the survey CSV one chunk of respondents at a time.
+
+    Each chunk is encoded against vocabularies that grow as new labels show up:
+    single choice columns into codes, multi-select columns into packed bitmaps.
+    Only one chunk of raw text is held at once, the rest is kept encoded, and
+    `survey()` renumbers everything into the final vocabulary order.
+    """
+
+    def __init__(self, chunk_rows=CHUNK_ROWS):
+        if chunk_rows <= 0 or chunk_rows % 8:
+            raise ValueError(f'chunk_rows must be a positive multiple of 8, got {chunk_rows}')
+        self.chunk_rows = chunk_rows
+        self.size = 0
+        self.vocabularies = {column: Vocabulary() for column in [*CATEGORICAL_COLUMNS, *MULTI_SELECT_COLUMNS]}
+        self.codes = {column: [] for column in CATEGORICAL_COLUMNS}
+        self.bits = {column: [] for column in MULTI_SELECT_COLUMNS}
+        self.years = []
+
+    def add(self, chunk):
+        """Encode the DataFrame `chunk` of the next respondents, at most chunk_rows of them."""
+        if self.size % self.chunk_rows or len(chunk) > self.chunk_rows:
+            raise ValueError(f'Only the last chunk may hold fewer than {self.chunk_rows} respondents')
+        self.size += len(chunk)
+
+        # Codes in order of appearance, -1 when unanswered
+        for column in CATEGORICAL_COLUMNS:
+            codes, labels = pd.factorize(chunk[column])
+            codes = np.append(self.vocabularies[column].add(labels), -1)[codes]
+            self.codes[column].append(codes.astype(np.int16))
+
+        # One bitmap per label of the chunk, missing answers become an empty row
+        for column in MULTI_SELECT_COLUMNS:
+            answers = chunk[column].reset_index(drop=True).str.split(';').explode()
+            answers = answers[answers.notna() & (answers != '')]
+            codes, labels = pd.factorize(answers)
+            one_hot = np.zeros((len(labels), len(chunk)), dtype=bool)
+            one_hot[codes, answers.index.to_numpy()] = True
+            self.bits[column].append((self.vocabularies[column].add(labels), np.packbits(one_hot, axis=1)))
+
+        self.years.append(encode_years(chunk['YearsCode']))
+
+    def _stack(self, column, labels):
+        """Return the bitmaps of `column` for every chunk side by side, one row per label of `labels`."""
+        order = self.vocabularies[column].order(labels)
+        bits = np.zeros((len(labels), packed_size(self.size)), dtype=np.uint8)
+        start = 0
+        for rows, chunk in self.bits[column]:
+            bits[order[rows], start:start + chunk.shape[1]] = chunk
+            start += chunk.shape[1]
+        return bits
+
+    def survey(self):
+        """Return the SurveyData of every chunk added so far."""
+        vocabularies = order_vocabularies({column: list(vocabulary.codes)
+                                           for column, vocabulary in self.vocabularies.items()})
+
+        codes = {}
+        for column in CATEGORICAL_COLUMNS:
+            order = self.vocabularies[column].order(vocabularies[column])
+            column_codes = np.concatenate([order[chunk] for chunk in self.codes[column]])
+            if column in UNANSWERED_COLUMNS and (column_codes < 0).any():
+                vocabularies[column].append(NOT_ANSWERED)
+                column_codes[column_codes < 0] = len(vocabularies[column]) - 1
+            codes[column] = column_codes.astype(code_dtype(vocabularies[column]))
+        years = np.concatenate(self.years)
+
+        filter_index = FilterIndex(age=build_bitmaps(codes['Age'], len(vocabularies['Age']), self.chunk_rows),
+                                   ed_level=build_bitmaps(codes['EdLevel'], len(vocabularies['EdLevel']),
+                                                          self.chunk_rows),
+                                   employment=self._stack('Employment', vocabularies['Employment']),
+                                   dev_status=build_bitmaps(codes['MainBranch'], len(vocabularies['MainBranch']),
+                                                            self.chunk_rows),
+                                   years_upto=build_years_upto(years, self.chunk_rows))
+
+        # Technologies in alphabetical order, like str.get_dummies
+        tech_matrices = {}
+        for columns in TECH_COLUMNS.values():
+            for column in columns:
+                labels = sorted(self.vocabularies[column].codes)
+                tech_matrices[column] = TechMatrix(labels=np.array(labels, dtype=object),
+                                                   bits=self._stack(column, labels))
+        tech_matrices.update(build_retained(tech_matrices))
+
+        return SurveyData(vocabularies, codes, years, filter_index, tech_matrices)
+
+
+def selected_codes(values, count):
+    """Return the valid codes among the dropdown `values`, sorted and without duplicates."""
+    return sorted({value for value in values or [] if isinstance(value, int) and 0 <= value < count})
+
+
+def any_of(bitmaps, values):
+    """OR together the bitmaps of the selected codes."""
+    codes = selected_codes(values, len(bitmaps))
+    if not codes:
+        return np.zeros(bitmaps.shape[1], dtype=np.uint8)
+    return np.bitwise_or.reduce(bitmaps[codes], axis=0)
+
+
+def years_between(index, years_code):
+    """Return the bitmap of respondents with years_code[0] <= YearsCode <= years_code[1]."""
+    low, high = years_code
+    top = len(index.years_upto) - 1
+    if high < 0:
+        return np.zeros(index.years_upto.shape[1], dtype=np.uint8)
+    rows = index.years_upto[min(int(high), top)].copy()
+    if low > 0:
+        rows &= ~index.years_upto[min(int(np.ceil(low)) - 1, top)]
+    return rows
+
+
+def filter_rows(index, age, ed_level, employ_status, dev_status, years_code):
+    """Return the packed bitmap of respondents matching every filter."""
+
+    # A respondent matches a dropdown when any of its values is selected
+    rows = any_of(index.age, age)
+    rows &= any_of(index.ed_level, ed_level)
+    rows &= any_of(index.employment, employ_status)
+    rows &= any_of(index.dev_status, dev_status)
+    rows &= years_between(index, years_code)
+    return rows
+
+
+def unpack_rows(rows, count):
+    """Turn a packed respondent bitmap back into a boolean row mask."""
+    return np.unpackbits(rows, count=count).view(bool)
+
+
+def count_bits(bits, mask):
+    """Count the rows set in both `bits` and the packed row `mask`."""
+    both = np.bitwise_and(bits, mask)
+
+    # NumPy 2 counts bits in place, older versions go through the lookup table
+    if hasattr(np, 'bitwise_count'):
+        both = np.bitwise_count(both, out=both)
+    else:
+        both = POPCOUNT[both]
+    return both.sum(axis=-1, dtype=np.int64)
+
+
+def ranked_counts(labels, counts, column, n=None):
+    """Return the non-zero `counts` as a DataFrame sorted in descending order.
+
+    The result has the same shape as `value_counts().head(n).reset_index()`,
+    so it can be passed straight to plotly express.
+    """
+
+    # Stable sort keeps ties in vocabulary order
+    order = np.argsort(-counts, kind='stable')[:n]
+    order = order[counts[order] > 0]
+    return pd.DataFrame({column: np.asarray(labels, dtype=object)[order], 'count': counts[order]})
+
+
+def read_survey(path, chunk_rows=CHUNK_ROWS):
+    """Parse the survey CSV into SurveyData, `chunk_rows` respondents at a time."""
+    reader = SurveyReader(chunk_rows)
+
+    # Everything is read as text, only the dashboard's columns are kept
+    with pd.read_csv(path, usecols=COLUMNS, dtype=str, chunksize=chunk_rows) as chunks:
+        for chunk in chunks:
+            reader.add(chunk)
+    return reader.survey()
+
+
+def file_digest(path):
+    """Return the SHA-1 of the file at `path`."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(path):
+    """Return the size, mtime and SHA-1 of the CSV at `path`."""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': file_digest(path)}
+
+
+def is_fresh(source, path):
+    """Check whether the snapshot `source` record still matches the CSV at `path`."""
+    stat = os.stat(path)
+    if stat.st_size != source['size']:
+        return False
+
+    # A fresh checkout changes the mtime, so fall back to the content hash
+    return stat.st_mtime_ns == source['mtime_ns'] or file_digest(path) == source['sha1']
+
+
+def save_array(path, array):
+    """Write `array` to the `.npy` file at `path` by swapping in a new file.
+
+    Rewriting the file in place would truncate it under the workers that
+    memory-map it in shared mode, which then crash with SIGBUS. Replacing it
+    leaves them reading the old file until they load the snapshot again.
+    """
+    with open(path + '.tmp', 'wb') as file:
+        np.save(file, array)
+    os.replace(path + '.tmp', path)
+
+
+def save_snapshot(survey, directory, path):
+    """Write `survey`, parsed from the CSV at `path`, as a columnar snapshot.
+
+    The snapshot is a directory of `.npy` arrays plus a `meta.json` holding the
+    vocabularies and a fingerprint of the source CSV.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    # Remove the metadata first so a half written snapshot is never loaded
+    meta_path = os.path.join(directory, 'meta.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    meta = {'format': SNAPSHOT_FORMAT,
+            'source': source_fingerprint(path),
+            'vocabularies': survey.vocabularies,
+            'tech': {column: matrix.labels.tolist() for column, matrix in survey.tech_matrices.items()}}
+
+    arrays = {'years': survey.years}
+    arrays.update({f'codes-{column}': codes for column, codes in survey.codes.items()})
+    arrays.update({f'filter-{name}': bitmaps for name, bitmaps in survey.filter_index._asdict().items()})
+    arrays.update({f'tech-{column}': matrix.bits for column, matrix in survey.tech_matrices.items()})
+    for name, array in arrays.items():
+        save_array(os.path.join(directory, name + '.npy'), array)
+
+    with open(meta_path + '.tmp', 'w') as file:
+        json.dump(meta, file)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def load_snapshot(directory, path, shared=False):
+    """Load the snapshot in `directory`, or return None when it is missing or stale.
+
+    With `shared` the arrays are memory-mapped read-only instead of read into
+    memory, so processes loading the same snapshot share its pages.
+    """
+    try:
+        with open(os.path.join(directory, 'meta.json')) as file:
+            meta = json.load(file)
+    except FileNotFoundError:
+        return None
+    if meta['format'] != SNAPSHOT_FORMAT or not is_fresh(meta['source'], path):
+        return None
+
+    def load(name):
+        return np.load(os.path.join(directory, name + '.npy'), mmap_mode='r' if shared else None)
+
+    codes = {column: load(f'codes-{column}') for column in CATEGORICAL_COLUMNS}
+    filter_index = FilterIndex(**{name: load(f'filter-{name}') for name in FilterIndex._fields})
+    tech_matrices = {column: TechMatrix(labels=np.array(labels, dtype=object), bits=load(f'tech-{column}'))
+                     for column, labels in meta['tech'].items()}
+
+    return SurveyData(meta['vocabularies'], codes, load('years'), filter_index, tech_matrices)
+
+
+def load_survey(path=DATA_PATH, snapshot_dir=SNAPSHOT_DIR, shared=SHARED_DATA):
+    """Load the survey from its snapshot, falling back to the CSV when the snapshot is stale."""
+    survey = load_snapshot(snapshot_dir, path, shared)
+    if survey is None:
+        logger.warning('Snapshot %s is missing or out of date, reading %s%s. '
+                       'Run build_snapshot.py to speed up startup.', snapshot_dir, path,
+                       ' into private memory' if shared else '')
+        survey = read_survey(path)
+    return survey
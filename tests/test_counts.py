@@ -0,0 +1,217 @@
+# Check the encoded survey counts against brute-force pandas on a synthetic survey
+#
+#   python -m pytest tests
+
+# Import libraries
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import data_cube
+import filter_engine
+from benchmarks.callbacks import SELECTIONS, synthetic_survey
+from cooccurrence import CoOccurrence, cooccurrence_counts
+from data_cube import CubeEngine, build_cube
+from filter_engine import FilterEngine
+from survey_data import (CHUNK_ROWS, COLUMNS, NOT_ANSWERED, RETAINED_COLUMNS, TECH_COLUMNS, UNANSWERED_COLUMNS,
+                         count_bits, filter_rows, read_survey, unpack_rows)
+
+# Respondents of the synthetic survey, not a multiple of 8 so the last bitmap byte is partial
+SIZE = 2021
+
+# Dropdown columns of the filters, in the order of the callback arguments
+FILTER_COLUMNS = ['Age', 'EdLevel', 'Employment', 'MainBranch']
+
+
+@pytest.fixture(scope='module')
+def csv(tmp_path_factory):
+    path = tmp_path_factory.mktemp('survey') / 'survey.csv'
+    synthetic_survey(SIZE, seed=1).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def frame(csv):
+    frame = pd.read_csv(csv, usecols=COLUMNS, dtype=str)
+
+    # Unanswered filter values can be selected like any other
+    frame[UNANSWERED_COLUMNS] = frame[UNANSWERED_COLUMNS].fillna(NOT_ANSWERED)
+    return frame
+
+
+@pytest.fixture(scope='module')
+def survey(csv):
+    return read_survey(csv)
+
+
+def selections(survey, count=20, seed=0):
+    """Return the filter arguments of the benchmark selections plus `count` random ones."""
+    sizes = [len(survey.vocabularies[column]) for column in FILTER_COLUMNS]
+    filters = [selection(sizes) for selection in SELECTIONS.values()]
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        filters.append([sorted(rng.choice(size, rng.integers(0, size + 1), replace=False).tolist())
+                        for size in sizes] + [sorted(rng.integers(0, 51, 2).tolist())])
+    return filters
+
+
+def reference_rows(frame, vocabularies, age, ed_level, employ_status, dev_status, years_code):
+    """Return the boolean mask of the respondents matching the filters, straight from the frame."""
+    def labels(column, codes):
+        return {vocabularies[column][code] for code in codes}
+
+    employments = labels('Employment', employ_status)
+    years = pd.to_numeric(frame['YearsCode'], errors='coerce')
+    return (frame['Age'].isin(labels('Age', age)) &
+            frame['EdLevel'].isin(labels('EdLevel', ed_level)) &
+            frame['Employment'].str.split(';').apply(lambda values: isinstance(values, list) and
+                                                     not employments.isdisjoint(values)) &
+            frame['MainBranch'].isin(labels('MainBranch', dev_status)) &
+            years.between(*years_code)).to_numpy()
+
+
+def reference_counts(frame, mask, column, labels):
+    """Count every one of the `labels` in the multi-select `column` among the `mask` respondents."""
+    answers = frame.loc[mask, column].dropna().str.split(';').explode()
+    return answers.value_counts().reindex(labels, fill_value=0).to_numpy()
+
+
+def test_filter_rows_match_frame(frame, survey):
+    for filters in selections(survey):
+        rows = filter_rows(survey.filter_index, *filters)
+        mask = reference_rows(frame, survey.vocabularies, *filters)
+        assert np.array_equal(unpack_rows(rows, SIZE), mask), filters
+
+        for column in [column for columns in TECH_COLUMNS.values() for column in columns]:
+            matrix = survey.tech_matrices[column]
+            assert np.array_equal(count_bits(matrix.bits, rows),
+                                  reference_counts(frame, mask, column, matrix.labels)), (column, filters)
+
+
+def test_filter_engine_ignores_invalid_values(survey):
+    engine = FilterEngine(survey)
+    for selection in selections(survey):
+        rows = filter_rows(survey.filter_index, *selection)
+        noisy = [[*values, 'x', None, -1, 999] for values in selection[:4]] + [selection[4]]
+        assert np.array_equal(engine.rows(*noisy), rows), selection
+        assert np.array_equal(engine.rows(*[values[::-1] for values in selection[:4]], selection[4]), rows)
+
+
+def test_unanswered_filters_are_selected_by_default(csv, survey):
+    # The synthetic survey leaves EdLevel unanswered for some respondents
+    raw = pd.read_csv(csv, usecols=COLUMNS, dtype=str)
+    assert raw['EdLevel'].isna().any()
+    assert survey.vocabularies['EdLevel'][-1] == NOT_ANSWERED
+
+    # Everything selected matches every respondent with an employment and a YearsCode in range
+    rows = unpack_rows(filter_rows(survey.filter_index, *selections(survey, count=0)[0]), SIZE)
+    years = pd.to_numeric(raw['YearsCode'], errors='coerce')
+    assert rows.sum() == (raw['Employment'].notna() & years.between(0, 50)).sum()
+    assert rows[raw['EdLevel'].isna().to_numpy()].any()
+
+
+@pytest.mark.parametrize('cell_bytes', [0, data_cube.CELL_BYTES])
+def test_cube_matches_filter_engine(survey, monkeypatch, cell_bytes):
+    # With 0 bytes a cell every selection is answered from the cube cells
+    monkeypatch.setattr(data_cube, 'CELL_BYTES', cell_bytes)
+    cube = build_cube(survey)
+    engine = CubeEngine(survey, cube, FilterEngine(survey))
+    filters = FilterEngine(survey)
+    for selection in selections(survey):
+        rows = engine.rows(*selection)
+        assert isinstance(rows, tuple) or cell_bytes
+
+        # Stray dropdown values are ignored, like by the filter engine
+        noisy = engine.rows(*[[*values, 'x', None] for values in selection[:4]], selection[4])
+        assert type(noisy) is type(rows)
+        for noisy_part, part in zip(noisy, rows) if isinstance(rows, tuple) else [(noisy, rows)]:
+            assert np.array_equal(noisy_part, part), selection
+        for column in cube.columns:
+            assert np.array_equal(engine.counts(column, rows),
+                                  filters.counts(column, filters.rows(*selection))), (column, selection)
+
+
+@pytest.mark.parametrize('chunk_rows', [8, 64, 1000])
+def test_chunked_reader_matches_whole(csv, frame, survey, chunk_rows):
+    # The fixture reads the whole survey as one chunk, whose codes follow the frame
+    assert SIZE <= CHUNK_ROWS
+    for column, codes in survey.codes.items():
+        labels = np.append(np.array(survey.vocabularies[column], dtype=object), None)
+        assert list(labels[codes]) == [None if pd.isna(label) else label for label in frame[column]], column
+
+    chunked = read_survey(csv, chunk_rows)
+    assert chunked.vocabularies == survey.vocabularies
+    assert chunked.codes.keys() == survey.codes.keys()
+    for column, codes in survey.codes.items():
+        assert chunked.codes[column].dtype == codes.dtype
+        assert np.array_equal(chunked.codes[column], codes), column
+    assert np.array_equal(chunked.years, survey.years)
+    for name, bitmaps in survey.filter_index._asdict().items():
+        assert np.array_equal(getattr(chunked.filter_index, name), bitmaps), name
+    assert chunked.tech_matrices.keys() == survey.tech_matrices.keys()
+    for column, matrix in survey.tech_matrices.items():
+        assert list(chunked.tech_matrices[column].labels) == list(matrix.labels), column
+        assert np.array_equal(chunked.tech_matrices[column].bits, matrix.bits), column
+
+
+def test_sharded_counts_match_unsharded(survey, monkeypatch):
+    engine = FilterEngine(survey)
+    columns = [*engine.bitmaps, *engine.codes]
+    filters = [engine.rows(*selection) for selection in selections(survey)]
+    expected = [[engine._count(column, rows) for column in columns] for rows in filters]
+
+    # Shards of 64 respondents on a pool of 4 threads, the last shard ends in a partial byte
+    monkeypatch.setattr(filter_engine, 'SHARD_ROWS', 64)
+    monkeypatch.setattr(filter_engine, 'COUNT_THREADS', 4)
+    monkeypatch.setattr(filter_engine, 'pool', None)
+    for rows, counts in zip(filters, expected):
+        for column, count in zip(columns, counts):
+            assert np.array_equal(engine._count(column, rows), count), column
+
+
+def test_retained_counts_match_frame(frame, survey):
+    for selection in selections(survey):
+        rows = filter_rows(survey.filter_index, *selection)
+        mask = reference_rows(frame, survey.vocabularies, *selection)
+        for column, (have, want) in RETAINED_COLUMNS.items():
+            # Respondents who have worked with a technology and want to keep working with it
+            matrix = survey.tech_matrices[column]
+            used = frame.loc[mask, have].fillna('').str.split(';')
+            desired = frame.loc[mask, want].fillna('').str.split(';')
+            counts = [sum(label in kept and label in wanted for kept, wanted in zip(used, desired))
+                      for label in matrix.labels]
+            assert list(matrix.labels) == list(survey.tech_matrices[have].labels), column
+            assert np.array_equal(count_bits(matrix.bits, rows), counts), (column, selection)
+
+
+def test_cooccurrence_matches_frame(frame, survey):
+    columns = TECH_COLUMNS['tech-used']
+    filters = selections(survey, count=5)
+
+    # Precomputed on the first selection, which selects everything like the page opens with
+    cooccurrence = CoOccurrence(survey, columns, filter_rows(survey.filter_index, *filters[0]))
+    rng = np.random.default_rng(0)
+    for selection in filters:
+        rows = filter_rows(survey.filter_index, *selection)
+        mask = reference_rows(frame, survey.vocabularies, *selection)
+        for column in columns:
+            labels = survey.tech_matrices[column].labels
+            for label in rng.choice(labels, 2, replace=False):
+                users = mask & frame[column].fillna('').str.split(';').apply(lambda values: label in values)
+                code = cooccurrence.code(column, label)
+                for other in columns:
+                    expected = reference_counts(frame, users.to_numpy(), other, survey.tech_matrices[other].labels)
+                    assert np.array_equal(cooccurrence.among(column, code, other, rows), expected), \
+                        (column, label, other)
+
+    # Chunks of 64 respondents add up to the single chunk counts
+    chunked = cooccurrence_counts(cooccurrence.bitmaps, cooccurrence.rows, chunk_rows=64)
+    assert chunked.keys() == cooccurrence.counts.keys()
+    for pair, counts in cooccurrence.counts.items():
+        assert np.array_equal(chunked[pair], counts), pair
@@ -0,0 +1,31 @@
+# Check that the dataset store loads years once and unloads the idle ones
+#
+#   python -m pytest tests
+
+# Import libraries
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dataset_store import DatasetStore, parse_years
+
+
+def test_unloads_idle_years_but_the_newest():
+    loads = []
+    years = parse_years('2023=old.csv,2024=new.csv,2022=older.csv')
+    store = DatasetStore(lambda year, path: loads.append(year) or path, years, idle_seconds=0.01)
+    assert list(years) == ['2024', '2023', '2022']
+
+    assert [store.get(year) for year in years] == ['new.csv', 'old.csv', 'older.csv']
+    assert store.get('2023') == 'old.csv'
+    assert loads == ['2024', '2023', '2022']
+
+    # Once idle, every year but the newest is unloaded
+    time.sleep(0.02)
+    store.get('2022')
+    assert sorted(store.loaded()) == ['2022', '2024']
+    store.get('2024')
+    assert loads == ['2024', '2023', '2022']
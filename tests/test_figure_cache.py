@@ -0,0 +1,99 @@
+# Check the byte-bounded LRU eviction, the counters and the keys of the figure cache
+#
+#   python -m pytest tests
+
+# Import libraries
+import itertools
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import figure_cache
+from figure_cache import FigureCache, make_key
+
+
+class Clock:
+    """Stand-in for the time module, one second later on every call so entries never tie."""
+
+    def __init__(self):
+        self.ticks = itertools.count()
+
+    def time(self):
+        return float(next(self.ticks))
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(figure_cache, 'time', Clock())
+    return FigureCache(str(tmp_path / 'cache.sqlite3'), max_bytes=100)
+
+
+def size(value):
+    return len(json.dumps(value).encode())
+
+
+def stored_bytes(cache):
+    return cache._connect().execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+
+def test_evicts_least_recently_used_past_max_bytes(cache):
+    value = 'x' * 28
+    assert size(value) == 30
+    for key in 'abc':
+        cache.put(key, value)
+
+    # Reading an entry makes it the most recently used
+    assert cache.get('a') == value
+    cache.put('d', value)
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == [value] * 3
+
+    # A put larger than the whole cache is never stored
+    cache.put('e', 'x' * 200)
+    assert cache.get('e') is None
+
+    # Replacing an entry only counts its new size
+    cache.put('a', 'y')
+    assert cache.stats()['bytes'] == stored_bytes(cache) == 3 + 30 + 30
+
+
+def test_counters(cache):
+    cache.get('a')
+    cache.put('a', 'x' * 48)
+    cache.get('a')
+    cache.get('a')
+    cache.put('b', 'x' * 48)
+    cache.put('c', 'x' * 48)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (2, 1, 1)
+    assert (stats['entries'], stats['bytes']) == (2, 100)
+    assert stats['bytes'] == stored_bytes(cache)
+
+
+def test_reopened_cache_keeps_its_size(cache):
+    cache.put('a', 'x' * 48)
+    reopened = FigureCache(cache.path, max_bytes=100)
+    reopened.put('b', 'x' * 48)
+    reopened.put('c', 'x' * 48)
+    assert reopened.stats()['bytes'] == stored_bytes(reopened) == 100
+
+
+def test_versions_do_not_share_entries(cache):
+    cache.put('a', 1)
+    other = FigureCache(cache.path, max_bytes=100, version='other')
+    assert other.get('a') is None
+    assert cache.get('a') == 1
+
+
+def test_make_key_normalizes_arguments():
+    assert make_key('2024', [3, 1, 2], {'chart': 'a', 'type': 'chart'}) == \
+        make_key('2024', [1, 2, 3], {'type': 'chart', 'chart': 'a'})
+    assert make_key([1, 2]) != make_key([1, 2, 3])
+
+    # Lists mixing types, e.g. with a missing label, still sort
+    assert make_key(['b', None, float('nan'), 'a']) == make_key([float('nan'), 'a', None, 'b'])
@@ -0,0 +1,65 @@
+# Import libraries
+import logging
+import os
+import threading
+
+from flask import Response
+
+from metrics import STARTUP, timed
+
+logger = logging.getLogger(__name__)
+
+# Warm every worker up in the background when it starts, 0 serves the first requests cold
+WARMUP = os.environ.get('SURVEY_WARMUP', '1') == '1'
+
+
+class Warmup:
+    """Runs `task` once in a background thread and reports on /ready when it is done.
+
+    The worker answers requests while it warms up, /ready only returns 200 once
+    the task succeeded, so a health check can hold traffic back until then. A
+    failed task keeps /ready at 503. A process forked mid warm-up (gunicorn
+    --preload) waits for it first, so every worker starts warm and no lock of the
+    task is inherited held.
+    """
+
+    def __init__(self, task):
+        self.task = task
+        self.ready = threading.Event()
+        self.failed = False
+        self.thread = None
+        os.register_at_fork(before=self.wait)
+
+    def start(self):
+        """Run the task in the background, or mark the worker ready straight away without WARMUP."""
+        if not WARMUP:
+            self.ready.set()
+            return
+        self.thread = threading.Thread(target=self._run, name='warmup', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            with timed('warmup', STARTUP):
+                self.task()
+        except Exception:
+            logger.exception('Warm-up failed, /ready keeps answering 503')
+            self.failed = True
+        else:
+            self.ready.set()
+
+    def wait(self):
+        """Block until a running warm-up is done."""
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def init_app(self, server, path='/ready'):
+        """Serve the readiness check at `path` on the Flask `server`."""
+
+        @server.route(path)
+        def ready():
+            if self.ready.is_set():
+                return Response('ready\n', mimetype='text/plain')
+            if self.failed:
+                return Response('warm-up failed\n', status=503, mimetype='text/plain')
+            return Response('warming up\n', status=503, mimetype='text/plain')